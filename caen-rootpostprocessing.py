@@ -35,6 +35,7 @@
 #     - root_files: time (varchar), computer (varchar), daq_folder (varchar), dir (varchar), file (varchar), device (varchar).
 
 import argparse
+import contextlib
 import os
 import pandas as pd
 import uproot
@@ -163,9 +164,11 @@ def get_acquisition_start_from_settings(parent_folder):
             os.path.join(parent_folder, "settings.txt"),
         ]
 
+        # A single stat per candidate both checks existence and gives the mtime
         settings_file = None
         for f in possible_files:
-            if os.path.exists(f):
+            with contextlib.suppress(FileNotFoundError):
+                st = os.stat(f)
                 settings_file = f
                 break
 
@@ -185,7 +188,6 @@ def get_acquisition_start_from_settings(parent_folder):
                     print(f"Invalid date format: {e}. Please use YYYY-MM-DD HH:MM:SS (e.g., 2025-05-19 17:06:07)")
 
         # If a settings file exists, use its last modified time
-        st = os.stat(settings_file)
         acq_start_ns = getattr(st, "st_mtime_ns", int(st.st_mtime * 1_000_000_000))  # exact if available
         acq_start_sec = st.st_mtime  # float seconds (kept for prints/compat)
 
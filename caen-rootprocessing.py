@@ -1,5 +1,6 @@
 import os
 import argparse
+import contextlib
 import sys
 import re
 import numpy as np
@@ -120,9 +121,11 @@ def estimate_acquisition_start(file_path):
             os.path.join(parent_folder, "settings.txt"),
         ]
 
+        # A single stat per candidate both checks existence and gives the mtime
         settings_file = None
         for f in possible_files:
-            if os.path.exists(f):
+            with contextlib.suppress(FileNotFoundError):
+                st = os.stat(f)
                 settings_file = f
                 break
 
@@ -130,7 +133,6 @@ def estimate_acquisition_start(file_path):
             print(f"Error: neither settings.xml nor settings.txt found in {parent_folder}")
             return None, None, None  # (datetime, seconds(float), nanoseconds(int))
 
-        st = os.stat(settings_file)
         # Exact ns if available (Py 3.7+); otherwise fall back from float seconds
         acquisition_start_mtime_ns = getattr(st, "st_mtime_ns", int(st.st_mtime * 1_000_000_000))
         acquisition_start_datetime = datetime.fromtimestamp(acquisition_start_mtime_ns // 1_000_000_000)
@@ -301,11 +303,19 @@ def handle_root_file(file_path, table_prefix):
 # Dictionary to track processed files
 processed_files = {}
 
+def _existing_dir(value):
+    folder = os.path.expanduser(value.strip())
+    if not os.path.isdir(folder):
+        raise argparse.ArgumentTypeError(f"{folder} is not a valid directory")
+    return folder
+
+
 def _parse_args():
     parser = argparse.ArgumentParser(description="Monitor a folder for ROOT files and insert their events into Postgres.")
     parser.add_argument(
         "data_folder",
         nargs="?",
+        type=_existing_dir,
         help="Folder path containing ROOT files. If omitted, you'll be prompted.",
     )
     parser.add_argument(
@@ -334,14 +344,19 @@ class ModifiedFileHandler(FileSystemEventHandler):
 def main():
     args = _parse_args()
 
+    # Only fall back to prompting when someone is there to answer
+    interactive = sys.stdin.isatty()
+    if (not args.data_folder or not args.table_prefix) and not interactive:
+        print("Error: data_folder and table_prefix are required when not running interactively")
+        raise SystemExit(1)
+
     if args.data_folder:
-        data_folder = args.data_folder.strip()
+        data_folder = args.data_folder  # Already validated by _existing_dir
     else:
         data_folder = input("Enter the folder path containing ROOT files: ").strip()
-
-    if not os.path.isdir(data_folder):
-        print(f"Error: {data_folder} is not a valid directory")
-        raise SystemExit(1)
+        if not os.path.isdir(data_folder):
+            print(f"Error: {data_folder} is not a valid directory")
+            raise SystemExit(1)
 
     if args.table_prefix:
         table_prefix = args.table_prefix.strip()
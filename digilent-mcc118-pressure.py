@@ -5,11 +5,9 @@ from __future__ import print_function
 from time import sleep
 from sys import argv
 from datetime import datetime
-import csv
 import argparse
 import numpy as np
 import logging
-from collections import namedtuple
 from daqhats import mcc118, OptionFlags, HatIDs, HatError, AnalogInputMode, \
     AnalogInputRange
 import sys
@@ -22,6 +20,7 @@ sys.path.append(parent_dir)
 # Add the helper library path
 sys.path.append(os.path.expanduser("~/daqhats/examples/python/mcc134"))
 from daqhats_utils import select_hat_device, chan_list_to_mask
+from libs.ida_logging import CsvBatchWriter
 
 READ_ALL_AVAILABLE = -1
 
@@ -62,19 +61,13 @@ def reconnect_db():
 
 def setup_csv(channels):
     """
-    Setup and return a CSV writer and its associated file handle in a named tuple.
+    Setup and return the buffered CSV writer (flushed periodically, synced on close).
     """
-    CsvHandle = namedtuple('CsvHandle', ['writer', 'file'])
-    start_time = datetime.now()
-    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}.csv"
-    csv_file = open(filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["Timestamp"] + [f"Voltage_Ch{i}" for i in channels] +
-                         [f"Current_Ch{i} (mA)" for i in channels] +
-                         [f"Pressure_Ch{i} (bar)" for i in channels])
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return CsvBatchWriter(lambda part: f"{timestamp}.csv",
+                          ["Timestamp"] + [f"Voltage_Ch{i}" for i in channels] +
+                          [f"Current_Ch{i} (mA)" for i in channels] +
+                          [f"Pressure_Ch{i} (bar)" for i in channels])
 
 def main():
     # Parse command-line arguments
@@ -117,7 +110,7 @@ def main():
     except (HatError, ValueError) as err:
         logging.error(f"Hardware error: {err}")
     finally:
-        csv_handle.file.close()  # Only reference the file here for cleanup
+        csv_handle.close()  # Flushes and syncs the buffered rows
         if db_cloud:
             db_cloud.close()
         logging.info("DAQ acquisition stopped. Resources cleaned up.")
@@ -144,6 +137,12 @@ def read_and_display_data(hat, num_channels, csv_handle, db_cloud, table_name, r
     aggregation_buffer = np.empty((buffer_size_per_channel, num_channels))
     samples_collected = 0
 
+    # Conversion coefficients are constant for the whole run
+    pressure_span = pressure_highest - pressure_lowest
+    volts_to_pressure = pressure_span / 5.0
+    volts_to_milliamps = 1000.0 / resistor_value if resistor_value else 0.0
+    milliamps_to_pressure = pressure_span / 16.0
+
     while True:
         try:
             read_result = hat.a_in_scan_read(READ_ALL_AVAILABLE, timeout)
@@ -169,18 +168,13 @@ def read_and_display_data(hat, num_channels, csv_handle, db_cloud, table_name, r
                 # Calculate currents and pressures
                 if resistor_value == 0:
                     # Direct 0-5V to pressure mapping
-                    pressures = [
-                        ((voltage - 0) * (pressure_highest - pressure_lowest) / 5) + pressure_lowest
-                        for voltage in aggregated_values
-                    ]
+                    currents = np.zeros(num_channels)
+                    pressures = aggregated_values * volts_to_pressure + pressure_lowest
                 else:
                     # 4-20 mA conversion method
-                    currents = [(value / resistor_value) * 1000 for value in aggregated_values]
-                    pressures = [
-                        ((current - 4) * (pressure_highest - pressure_lowest) / 16) + pressure_lowest
-                        for current in currents
-                    ]
-                    
+                    currents = aggregated_values * volts_to_milliamps
+                    pressures = (currents - 4.0) * milliamps_to_pressure + pressure_lowest
+
                 timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
                 # Display output for each channel
@@ -189,13 +183,12 @@ def read_and_display_data(hat, num_channels, csv_handle, db_cloud, table_name, r
                     print(f"  Channel {i+1}: Voltage={voltage:.2f} V, Current={current:.2f} mA, Pressure={pressure:.2f} bar")
 
                 # Write to CSV
-                csv_handle.writer.writerow([timestamp] + aggregated_values.tolist() + currents + pressures)
-                csv_handle.file.flush()
+                csv_handle.writerow([timestamp] + aggregated_values.tolist() + currents.tolist() + pressures.tolist())
 
                 # Log to database
                 if db_cloud:
                     try:
-                        channels_array = np.array(aggregated_values.tolist() + currents + pressures)
+                        channels_array = np.concatenate((aggregated_values, currents, pressures))
                         success = db_cloud.log(table=table_name, channels=channels_array)
                         if not success:
                             logging.warning(f"Failed to log data to table '{table_name}'.")
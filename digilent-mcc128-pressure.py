@@ -5,11 +5,12 @@ from __future__ import print_function
 from time import sleep
 from sys import argv
 from datetime import datetime
-import csv
 import argparse
 import numpy as np
 import logging
-from collections import namedtuple
+import queue
+import signal
+import threading
 from daqhats import mcc128, OptionFlags, HatIDs, HatError, AnalogInputMode, \
     AnalogInputRange
 import sys
@@ -22,8 +23,13 @@ sys.path.append(parent_dir)
 # Add the helper library path
 sys.path.append(os.path.expanduser("~/daqhats/examples/python/mcc134"))
 from daqhats_utils import select_hat_device, chan_list_to_mask
+from libs.ida_logging import BatchPgLogger, CsvBatchWriter
+import psql_credentials as creds_cloud
 
 READ_ALL_AVAILABLE = -1
+DB_BATCH_SIZE = 10  # Aggregated rows per database round-trip
+IO_QUEUE_SIZE = 1024  # Aggregated rows buffered between acquisition and the I/O thread
+IO_SHUTDOWN_TIMEOUT = 10.0  # Seconds to wait for room in the I/O queue on shutdown
 
 # Setup logging
 logging.basicConfig(
@@ -37,44 +43,53 @@ logging.basicConfig(
 
 def init_db():
     """
-    Initialize and return the database connection and cursor.
+    Initialize and return the batched database logger.
+    The logger connects lazily and reconnects on its own after a failed flush.
     """
-    from ida_db import pglogger
-    import psql_credentials as creds_cloud
-    try:
-        db_cloud = pglogger(creds_cloud)
-        logging.info("Database connection initialized.")
-        return db_cloud
-    except Exception as e:
-        logging.error(f"Failed to initialize database connection: {e}")
-        return None
-
-def reconnect_db():
+    db_cloud = BatchPgLogger(creds_cloud, batch_size=DB_BATCH_SIZE)
+    logging.info(f"Database logging initialized (batches of {DB_BATCH_SIZE} rows).")
+    return db_cloud
+
+def setup_csv(channels):
     """
-    Attempt to reconnect to the database.
+    Setup and return the buffered CSV writer (flushed periodically, synced on close).
     """
-    logging.warning("Attempting to reconnect to the database...")
-    try:
-        return init_db()
-    except Exception as e:
-        logging.error(f"Reconnection failed: {e}")
-        return None
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return CsvBatchWriter(lambda part: f"{timestamp}.csv",
+                          ["Timestamp"] + [f"Voltage_Ch{i}" for i in channels] +
+                          [f"Current_Ch{i} (mA)" for i in channels] +
+                          [f"Pressure_Ch{i} (bar)" for i in channels])
 
-def setup_csv(channels):
+def handle_sigterm(signum, frame):
     """
-    Setup and return a CSV writer and its associated file handle in a named tuple.
+    Treat SIGTERM like Ctrl-C so the acquisition stops cleanly and buffered CSV rows are written.
     """
-    CsvHandle = namedtuple('CsvHandle', ['writer', 'file'])
-    start_time = datetime.now()
-    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}.csv"
-    csv_file = open(filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["Timestamp"] + [f"Voltage_Ch{i}" for i in channels] +
-                         [f"Current_Ch{i} (mA)" for i in channels] +
-                         [f"Pressure_Ch{i} (bar)" for i in channels])
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file)
+    raise KeyboardInterrupt
+
+def io_worker(io_queue, csv_handle, db_cloud, table_name):
+    """
+    Writes queued rows to CSV and the database so that disk and network latency
+    never stall the acquisition loop. A None item stops the worker.
+    """
+    while True:
+        item = io_queue.get()
+        if item is None:
+            break
+        timestamp, channels_array = item
+
+        # Write to CSV (buffered; flushed periodically and synced on shutdown)
+        try:
+            csv_handle.writerow([timestamp] + channels_array.tolist())
+        except Exception as e:
+            logging.error(f"CSV logging failed: {e}")
+
+        # Log to database (buffered; rows are kept and retried if a flush fails)
+        try:
+            success = db_cloud.log(table=table_name, channels=channels_array, time=timestamp)
+            if not success:
+                logging.warning(f"Failed to log data to table '{table_name}'. Will retry with the next batch.")
+        except Exception as e:
+            logging.error(f"Database logging failed: {e}")
 
 def main():
     # Parse command-line arguments
@@ -86,6 +101,8 @@ def main():
     parser.add_argument('--voltage', type=float, required=True, help="Voltage range for the pressure calculation (e.g., 5 V).")
     args = parser.parse_args()
 
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
     table_name = args.table
     resistor_value = args.resistor
     pressure_lowest = args.pressure_lowest
@@ -107,6 +124,11 @@ def main():
     # Initialize database logging
     db_cloud = init_db()
 
+    # CSV and database writes run on their own thread, fed by the acquisition loop
+    io_queue = queue.Queue(maxsize=IO_QUEUE_SIZE)
+    io_thread = threading.Thread(target=io_worker, args=(io_queue, csv_handle, db_cloud, table_name), daemon=True)
+    io_thread.start()
+
     try:
         address = select_hat_device(HatIDs.MCC_128)
         hat = mcc128(address)
@@ -117,13 +139,19 @@ def main():
         input('\nPress ENTER to continue ...')
         start_acquisition(hat, channel_mask, 0, scan_rate, options)
         logging.info("DAQ acquisition started. Press Ctrl-C to stop.")
-        read_and_display_data(hat, num_channels, csv_handle, db_cloud, table_name, resistor_value, pressure_lowest, pressure_highest, voltage_range=voltage_range)
+        read_and_display_data(hat, num_channels, io_queue, resistor_value, pressure_lowest, pressure_highest, voltage_range=voltage_range)
     except (HatError, ValueError) as err:
         logging.error(f"Hardware error: {err}")
     finally:
-        csv_handle.file.close()  # Only reference the file here for cleanup
-        if db_cloud:
-            db_cloud.close()
+        # Let the I/O thread drain what is queued, then stop; never block shutdown on a stuck thread
+        if io_thread.is_alive():
+            try:
+                io_queue.put(None, timeout=IO_SHUTDOWN_TIMEOUT)
+                io_thread.join()
+            except queue.Full:
+                logging.error("I/O thread is not draining its queue; rows still queued are lost.")
+        csv_handle.close()  # Flushes, syncs and closes the file
+        db_cloud.close()  # Flushes any rows still buffered
         logging.info("DAQ acquisition stopped. Resources cleaned up.")
 
 def start_acquisition(hat, channel_mask, samples_per_channel, scan_rate, options):
@@ -139,18 +167,29 @@ def stop_and_cleanup(hat):
     hat.a_in_scan_stop()
     hat.a_in_scan_cleanup()
 
-def read_and_display_data(hat, num_channels, csv_handle, db_cloud, table_name, resistor_value, pressure_lowest, pressure_highest, voltage_range=5.0):
+def read_and_display_data(hat, num_channels, io_queue, resistor_value, pressure_lowest, pressure_highest, voltage_range=5.0):
     """
     Reads and processes data from the DAQ with aggregation.
+    Aggregated rows are handed to the I/O thread through io_queue.
     """
     timeout = 5.0
     buffer_size_per_channel = 1000  # Matches the old code's buffer size
     aggregation_buffer = np.empty((buffer_size_per_channel, num_channels))
     samples_collected = 0
 
+    # Conversion coefficients are constant for the whole run
+    pressure_span = pressure_highest - pressure_lowest
+    volts_to_pressure = pressure_span / voltage_range
+    volts_to_milliamps = 1000.0 / resistor_value if resistor_value else 0.0
+    milliamps_to_pressure = pressure_span / 16.0
+
+    # Per-channel console output is only useful on a terminal (e.g. a tmux pane)
+    show_output = sys.stdout.isatty()
+
     while True:
         try:
-            read_result = hat.a_in_scan_read(READ_ALL_AVAILABLE, timeout)
+            # Read straight into a NumPy array so the samples never pass through a Python list
+            read_result = hat.a_in_scan_read_numpy(READ_ALL_AVAILABLE, timeout)
             if read_result.hardware_overrun:
                 logging.error("Hardware overrun detected.")
                 sleep(1.0)
@@ -162,54 +201,46 @@ def read_and_display_data(hat, num_channels, csv_handle, db_cloud, table_name, r
                 start_acquisition(hat, hat.channel_mask, 0, 1000.0, OptionFlags.CONTINUOUS)
                 continue
 
-            new_samples = np.array(read_result.data).reshape(-1, num_channels)
+            new_samples = read_result.data.reshape(-1, num_channels)
             samples_to_copy = min(buffer_size_per_channel - samples_collected, new_samples.shape[0])
             aggregation_buffer[samples_collected:samples_collected+samples_to_copy, :] = new_samples[:samples_to_copy, :]
             samples_collected += samples_to_copy
 
             if samples_collected >= buffer_size_per_channel:
-                aggregated_values = np.mean(aggregation_buffer, axis=0)
+                # The row [voltages | currents | pressures] is computed in place in one buffer.
+                # It is handed to the I/O thread, so it has to be a fresh array for every row.
+                channels_array = np.empty(3 * num_channels)
+                aggregated_values = np.mean(aggregation_buffer, axis=0, out=channels_array[:num_channels])
+                currents = channels_array[num_channels:2 * num_channels]
+                pressures = channels_array[2 * num_channels:]
                 samples_collected = 0  # Reset the sample count
 
                 # Calculate currents and pressures
                 if resistor_value == 0:
                     # Direct 0-5V to pressure mapping
-                    currents = [0 for value in aggregated_values]
-                    pressures = [
-                        ((voltage - 0) * (pressure_highest - pressure_lowest) / voltage_range) + pressure_lowest
-                        for voltage in aggregated_values
-                    ]
+                    currents.fill(0.0)
+                    np.multiply(aggregated_values, volts_to_pressure, out=pressures)
                 else:
                     # 4-20 mA conversion method
-                    currents = [(value / resistor_value) * 1000 for value in aggregated_values]
-                    pressures = [
-                        ((current - 4) * (pressure_highest - pressure_lowest) / 16) + pressure_lowest
-                        for current in currents
-                    ]
-
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-                # Display output for each channel
-                print(f"{timestamp}")
-                for i, (voltage, current, pressure) in enumerate(zip(aggregated_values, currents, pressures)):
-                    print(f"  Channel {i+1}: Voltage={voltage:.2f} V, Current={current:.2f} mA, Pressure={pressure:.2f} bar")
-
-                # Write to CSV
-                csv_handle.writer.writerow([timestamp] + aggregated_values.tolist() + currents + pressures)
-                csv_handle.file.flush()
-
-                # Log to database
-                if db_cloud:
-                    try:
-                        channels_array = np.array(aggregated_values.tolist() + currents + pressures)
-                        success = db_cloud.log(table=table_name, channels=channels_array)
-                        if not success:
-                            logging.warning(f"Failed to log data to table '{table_name}'.")
-                            db_cloud = reconnect_db()
-                    except Exception as e:
-                        logging.error(f"Database logging failed: {e}")
-                else:
-                    db_cloud = reconnect_db()
+                    np.multiply(aggregated_values, volts_to_milliamps, out=currents)
+                    np.subtract(currents, 4.0, out=pressures)
+                    pressures *= milliamps_to_pressure
+                pressures += pressure_lowest
+
+                timestamp = datetime.now().isoformat(' ', 'seconds')  # Same text as strftime('%Y-%m-%d %H:%M:%S'), but cheaper
+
+                # Display output for each channel in a single write
+                if show_output:
+                    sys.stdout.write(f"{timestamp}\n" + "".join(
+                        f"  Channel {i+1}: Voltage={voltage:.2f} V, Current={current:.2f} mA, Pressure={pressure:.2f} bar\n"
+                        for i, (voltage, current, pressure) in enumerate(zip(aggregated_values, currents, pressures))
+                    ))
+
+                # Hand off to the I/O thread
+                try:
+                    io_queue.put_nowait((timestamp, channels_array))
+                except queue.Full:
+                    logging.warning("I/O queue full; dropping aggregated row.")
 
         except KeyboardInterrupt:
             logging.info("Keyboard interrupt received. Stopping DAQ.")
@@ -21,10 +21,8 @@ from time import sleep
 import logging
 import argparse
 import numpy as np
-import csv
 import sys
 import os
-from collections import namedtuple
 from datetime import datetime
 from daqhats import mcc134, HatIDs, HatError, TcTypes
 
@@ -35,15 +33,14 @@ sys.path.append(parent_dir)
 # Add the helper library path
 sys.path.append(os.path.expanduser("~/daqhats/examples/python/mcc134"))
 from daqhats_utils import select_hat_device
+from libs.ida_logging import CsvBatchWriter, open_db_writer, start_queue_logging
 
-# Logging Setup
-logging.basicConfig(
+# Logging Setup (records are written by a listener thread, off the acquisition loop)
+start_queue_logging(
+    logging.FileHandler("mcc134_log.log"),
+    logging.StreamHandler(),
     level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler("mcc134_log.log"),
-        logging.StreamHandler()
-    ]
+    fmt='%(asctime)s [%(levelname)s] %(message)s'
 )
 
 # Constants
@@ -51,45 +48,16 @@ CURSOR_BACK_2 = '\x1b[2D'
 ERASE_TO_END_OF_LINE = '\x1b[0K'
 TEMPERATURE_CHANNELS = [0, 1, 2, 3]
 DELAY_BETWEEN_READS = 1  # Seconds
-
-def init_db():
-    """
-    Initialize and return the database connection.
-    """
-    from ida_db import pglogger
-    import psql_credentials as creds_cloud
-    try:
-        db_cloud = pglogger(creds_cloud)
-        logging.info("Database connection initialized.")
-        return db_cloud
-    except Exception as e:
-        logging.error(f"Failed to initialize database connection: {e}")
-        return None
-
-def reconnect_db():
-    """
-    Attempt to reconnect to the database.
-    """
-    logging.warning("Attempting to reconnect to the database...")
-    try:
-        return init_db()
-    except Exception as e:
-        logging.error(f"Reconnection failed: {e}")
-        return None
+DB_BATCH_SIZE = 100  # Rows per database round-trip
+DB_FLUSH_INTERVAL = 10.0  # Seconds; flush at least this often regardless of batch size
 
 def setup_csv(channels):
     """
-    Setup and return a CSV writer and its associated file handle in a named tuple.
+    Setup and return the buffered CSV writer for this run.
     """
-    CsvHandle = namedtuple('CsvHandle', ['writer', 'file'])
-    start_time = datetime.now()
-    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_thermocouple_data.csv"
-    csv_file = open(filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["Timestamp"] + [f"TC_Ch{i} (°C)" for i in channels])
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return CsvBatchWriter(lambda part: f"{timestamp}_thermocouple_data.csv",
+                          ["Timestamp"] + [f"TC_Ch{i} (°C)" for i in channels])
 
 def main():
     """
@@ -101,8 +69,8 @@ def main():
     args = parser.parse_args()
     table_name = args.table  # Assign the passed table name
 
-    # Initialize database connection
-    db_cloud = init_db()
+    # Initialize the background database writer
+    db_cloud = open_db_writer(table_name, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL)
 
     # Setup CSV logging
     csv_handle = setup_csv(TEMPERATURE_CHANNELS)
@@ -122,49 +90,51 @@ def main():
         print('\nAcquiring data ... Press Ctrl-C to abort')
 
         sample_count = 0
+        temp_buf = np.empty(len(TEMPERATURE_CHANNELS), dtype=np.float64)  # Reused for every sample
+
+        # Resolve the error sentinels and the read method once, outside the sampling loop
+        open_tc_value = mcc134.OPEN_TC_VALUE
+        overrange_tc_value = mcc134.OVERRANGE_TC_VALUE
+        common_mode_tc_value = mcc134.COMMON_MODE_TC_VALUE
+        t_in_read = hat.t_in_read
 
         while True:
             try:
                 # Increment sample count
                 sample_count += 1
 
-                # Read temperature data
-                temperature_data = []
-                for channel in TEMPERATURE_CHANNELS:
-                    value = hat.t_in_read(channel)
-                    if value == mcc134.OPEN_TC_VALUE:
+                # Read temperature data (invalid readings are stored as NaN)
+                for i, channel in enumerate(TEMPERATURE_CHANNELS):
+                    value = t_in_read(channel)
+                    if value == open_tc_value:
                         logging.warning(f"Channel {channel}: Open thermocouple detected.")
-                        temperature_data.append(None)
-                    elif value == mcc134.OVERRANGE_TC_VALUE:
+                        temp_buf[i] = np.nan
+                    elif value == overrange_tc_value:
                         logging.warning(f"Channel {channel}: Over-range condition.")
-                        temperature_data.append(None)
-                    elif value == mcc134.COMMON_MODE_TC_VALUE:
+                        temp_buf[i] = np.nan
+                    elif value == common_mode_tc_value:
                         logging.warning(f"Channel {channel}: Common mode error.")
-                        temperature_data.append(None)
+                        temp_buf[i] = np.nan
                     else:
-                        temperature_data.append(value)
+                        temp_buf[i] = value
 
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                now = datetime.now()
+                timestamp = now.isoformat(' ', 'seconds')  # Same text as strftime('%Y-%m-%d %H:%M:%S'), but cheaper
+                temperature_data = temp_buf.tolist()
 
                 # Print collected data
                 print(f"{timestamp} Sample {sample_count}")
                 for i, temp in enumerate(temperature_data):
-                    print(f"  Channel {i}: {'N/A' if temp is None else f'{temp:.2f} °C'}")
+                    print(f"  Channel {i}: {'N/A' if temp != temp else f'{temp:.2f} °C'}")
 
-                # Write data to CSV
-                csv_handle.writer.writerow([timestamp] + temperature_data)
-                csv_handle.file.flush()
+                # Write data to CSV (invalid readings stay empty cells)
+                csv_handle.writerow([timestamp] + ['' if temp != temp else temp for temp in temperature_data])
 
-                # Log data to the database
-                temp_array = np.array([t if t is not None else np.nan for t in temperature_data])  # Handle None values
-                success_cloud = db_cloud.log(table=table_name, channels=temp_array)
-                if not success_cloud:
-                    logging.warning(f"Failed to log temperature data to table '{table_name}'.")
-                    db_cloud = reconnect_db()
+                # Hand a snapshot to the database writer thread, since temp_buf is reused (NaN is stored as NULL)
+                db_cloud.enqueue(now, temp_buf.copy())
 
             except Exception as e:
                 logging.error(f"Error during data acquisition: {e}")
-                db_cloud = reconnect_db()
 
             # Wait the specified interval between reads
             sleep(DELAY_BETWEEN_READS)
@@ -172,9 +142,8 @@ def main():
     except KeyboardInterrupt:
         logging.info("Keyboard interrupt received. Stopping data acquisition.")
     finally:
-        csv_handle.file.close()
-        if db_cloud:
-            db_cloud.close()
+        csv_handle.close()
+        db_cloud.flush_and_close()  # Drains the queue and flushes any rows still buffered
         logging.info("Resources cleaned up and program terminated.")
 
 if __name__ == '__main__':
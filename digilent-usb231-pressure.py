@@ -4,11 +4,9 @@
 from __future__ import print_function
 from time import sleep
 from datetime import datetime
-import csv
 import argparse
 import numpy as np
 import logging
-from collections import namedtuple
 import sys
 import os
 
@@ -18,6 +16,8 @@ from mcculw.enums import ScanOptions, FunctionType, Status
 from mcculw.device_info import DaqDeviceInfo
 from ctypes import cast, POINTER, c_double
 
+from libs.ida_logging import CsvBatchWriter, open_db_writer
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,37 +28,16 @@ logging.basicConfig(
     ]
 )
 
-def init_db():
-    from ida_db import pglogger
-    import psql_credentials as creds_cloud
-    try:
-        db_cloud = pglogger(creds_cloud)
-        logging.info("Database connection initialized.")
-        return db_cloud
-    except Exception as e:
-        logging.error(f"Failed to initialize database connection: {e}")
-        return None
-
-def reconnect_db():
-    logging.warning("Attempting to reconnect to the database...")
-    try:
-        return init_db()
-    except Exception as e:
-        logging.error(f"Reconnection failed: {e}")
-        return None
+DB_BATCH_SIZE = 100  # Rows per database round-trip
+DB_FLUSH_INTERVAL = 10.0  # Seconds; flush at least this often regardless of batch size
+SCAN_BUFFER_WINDOWS = 4  # Aggregation windows held by the circular scan buffer
 
 def setup_csv(channels):
-    CsvHandle = namedtuple('CsvHandle', ['writer', 'file'])
-    start_time = datetime.now()
-    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}.csv"
-    csv_file = open(filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["Timestamp"] + [f"Voltage_Ch{i}" for i in channels] +
-                         [f"Current_Ch{i} (mA)" for i in channels] +
-                         [f"Pressure_Ch{i} (bar)" for i in channels])
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return CsvBatchWriter(lambda part: f"{timestamp}.csv",
+                          ["Timestamp"] + [f"Voltage_Ch{i}" for i in channels] +
+                          [f"Current_Ch{i} (mA)" for i in channels] +
+                          [f"Pressure_Ch{i} (bar)" for i in channels])
 
 def start_acquisition(board_num, low_chan, high_chan, total_count, scan_rate, ai_range, memhandle):
     scan_options = ScanOptions.BACKGROUND | ScanOptions.SCALEDATA | ScanOptions.CONTINUOUS
@@ -68,66 +47,82 @@ def start_acquisition(board_num, low_chan, high_chan, total_count, scan_rate, ai
 def stop_and_cleanup(board_num):
     ul.stop_background(board_num, FunctionType.AIFUNCTION)
 
-def read_and_display_data(board_num, num_channels, csv_handle, db_cloud, table_name,
+def read_and_display_data(board_num, num_channels, csv_handle, db_cloud,
                           resistor_value, pressure_lowest, pressure_highest,
                           memhandle, total_count, scan_rate, aggregation_seconds):
 
     buffer_size_per_channel = scan_rate * aggregation_seconds
     required_samples = buffer_size_per_channel * num_channels
-    aggregation_buffer = np.empty((buffer_size_per_channel, num_channels))
     ctypes_array = cast(memhandle, POINTER(c_double))
+    scan_buffer = np.ctypeslib.as_array(ctypes_array, shape=(total_count,))  # Zero-copy view of the scan buffer
+
+    # Conversion coefficients (constant for the whole run)
+    volts_to_milliamps = 1000.0 / resistor_value
+    milliamps_to_pressure = (pressure_highest - pressure_lowest) / 16.0
 
-    prev_count = 0  # total number of samples previously read
+    prev_count = 0  # total number of samples consumed; prev_count % total_count is the ring read position
+    window_sum = np.zeros(num_channels)  # running per-channel sum of the current window
+    window_filled = 0  # samples accumulated into window_sum so far
+    csv_row = [None] * (1 + 3 * num_channels)  # Timestamp, voltages, currents, pressures; reused every window
 
     while True:
         try:
             status, curr_count, curr_index = ul.get_status(board_num, FunctionType.AIFUNCTION)
 
-            if (curr_count - prev_count) < required_samples:
+            available = curr_count - prev_count
+            available -= available % num_channels  # whole channel scans only
+
+            if available >= total_count:
+                # The scan lapped us and overwrote unread samples; restart the window at the write position
+                logging.warning(f"Scan buffer overrun; dropped {available + window_filled} samples.")
+                prev_count += available
+                window_sum.fill(0.0)
+                window_filled = 0
+                continue
+
+            # Fold the new samples into the running sum as they arrive, in one span or two when the ring wraps
+            take = min(available, required_samples - window_filled)
+            if take:
+                start_index = prev_count % total_count
+                end_index = start_index + take
+                if end_index <= total_count:
+                    window_sum += scan_buffer[start_index:end_index].reshape(-1, num_channels).sum(axis=0)
+                else:
+                    window_sum += scan_buffer[start_index:].reshape(-1, num_channels).sum(axis=0)
+                    window_sum += scan_buffer[:end_index - total_count].reshape(-1, num_channels).sum(axis=0)
+                prev_count += take
+                window_filled += take
+
+            if window_filled < required_samples:
+                sleep(0.01)
                 continue  # not enough new data yet
 
-            # Aggregate 5 seconds' worth of data
-            start_index = (curr_index - required_samples) % total_count
-            for i in range(buffer_size_per_channel):
-                for ch in range(num_channels):
-                    idx = (start_index + i * num_channels + ch) % total_count
-                    aggregation_buffer[i, ch] = ctypes_array[idx]
-
-            # Average across time
-            aggregated_values = np.mean(aggregation_buffer, axis=0)
+            # Window complete: average across time and start the next one
+            aggregated_values = window_sum / buffer_size_per_channel
+            window_sum.fill(0.0)
+            window_filled = 0
 
             # Voltage → Current → Pressure
-            currents = [(v / resistor_value) * 1000 for v in aggregated_values]
-            pressures = [
-                ((current - 4) * (pressure_highest - pressure_lowest) / 16) + pressure_lowest
-                for current in currents
-            ]
+            currents = aggregated_values * volts_to_milliamps
+            pressures = (currents - 4.0) * milliamps_to_pressure + pressure_lowest
+            channels_array = np.concatenate((aggregated_values, currents, pressures))
 
             total_values = buffer_size_per_channel * num_channels
             logging.info(f"Aggregated {buffer_size_per_channel} samples per channel ({total_values} total values)")
 
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            now = datetime.now()
+            timestamp = now.isoformat(' ', 'seconds')  # Same text as strftime('%Y-%m-%d %H:%M:%S'), but cheaper
             print(f"{timestamp}")
             for i, (voltage, current, pressure) in enumerate(zip(aggregated_values, currents, pressures)):
                 print(f"  Channel {i+1}: Voltage={voltage:.2f} V, Current={current:.2f} mA, Pressure={pressure:.2f} bar")
 
 
-            csv_handle.writer.writerow([timestamp] + aggregated_values.tolist() + currents + pressures)
-            csv_handle.file.flush()
-
-            if db_cloud:
-                try:
-                    combined = np.array(aggregated_values.tolist() + currents + pressures)
-                    success = db_cloud.log(table=table_name, channels=combined)
-                    if not success:
-                        logging.warning(f"Failed to log data to table '{table_name}'.")
-                        db_cloud = reconnect_db()
-                except Exception as e:
-                    logging.error(f"Database logging failed: {e}")
-            else:
-                db_cloud = reconnect_db()
+            csv_row[0] = timestamp
+            csv_row[1:] = channels_array.tolist()
+            csv_handle.writerow(csv_row)
 
-            prev_count += required_samples  # track how much data we've used
+            # Handed to the database writer thread; never blocks the acquisition loop
+            db_cloud.enqueue(now, channels_array)
 
         except KeyboardInterrupt:
             logging.info("Keyboard interrupt received. Stopping DAQ.")
@@ -155,7 +150,7 @@ def main():
     scan_rate = 12500
     aggregation_seconds = 1
     points_per_channel = scan_rate * aggregation_seconds  # 5000
-    total_count = points_per_channel * num_channels
+    total_count = points_per_channel * num_channels * SCAN_BUFFER_WINDOWS
             
     board_num = 0
 
@@ -164,7 +159,8 @@ def main():
     ai_range = daq_dev_info.get_ai_info().supported_ranges[0]
 
     csv_handle = setup_csv(channels)
-    db_cloud = init_db()
+    # Inserts are batched on a writer thread so a slow round-trip never delays draining the scan buffer
+    db_cloud = open_db_writer(table_name, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL)
 
     try:
         daq_dev_info = DaqDeviceInfo(board_num)
@@ -180,15 +176,14 @@ def main():
         start_acquisition(board_num, low_chan, high_chan, total_count, scan_rate, ai_range, memhandle)
         logging.info("DAQ acquisition started. Press Ctrl-C to stop.")
 
-        read_and_display_data(board_num, num_channels, csv_handle, db_cloud, table_name,resistor_value, pressure_lowest, pressure_highest,memhandle, total_count, scan_rate, aggregation_seconds)
+        read_and_display_data(board_num, num_channels, csv_handle, db_cloud, resistor_value, pressure_lowest, pressure_highest,memhandle, total_count, scan_rate, aggregation_seconds)
 
 
     except Exception as e:
         logging.error(f"Error: {e}")
     finally:
-        csv_handle.file.close()
-        if db_cloud:
-            db_cloud.close()
+        csv_handle.close()
+        db_cloud.flush_and_close()  # Drains the queue and flushes any rows still buffered
         logging.info("DAQ acquisition stopped. Resources cleaned up.")
 
 if __name__ == '__main__':
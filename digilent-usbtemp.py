@@ -4,77 +4,57 @@ import time
 import logging
 import numpy as np
 import argparse
-from uldaq import TempScale, DaqDeviceInfo, get_daq_device_inventory, InterfaceType, DaqDevice
-from collections import namedtuple
+from uldaq import TempScale, TInListFlag, DaqDeviceInfo, get_daq_device_inventory, InterfaceType, DaqDevice, AiDevice
 from datetime import datetime
-import csv
 import sys
 import os
+import queue
+import threading
 
 # Add the parent directory (../) to the Python path
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(parent_dir)
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler("usb_temp_log.log"),
-        logging.StreamHandler()
-    ]
+from libs.ida_logging import CsvBatchWriter, open_db_writer, start_queue_logging
+
+# Setup logging (records are written by a listener thread, off the acquisition loop)
+# The level can be raised for unattended runs, e.g. LOGLEVEL=WARNING
+start_queue_logging(
+    logging.FileHandler("usb_temp_log.log"),
+    logging.StreamHandler(),
+    level=os.environ.get("LOGLEVEL", "INFO").upper(),
+    fmt='%(asctime)s [%(levelname)s] %(message)s'
 )
 
-TEMPERATURE_CHANNELS = [0, 1, 2, 3, 4, 5]
+TEMPERATURE_CHANNELS = [0, 1, 2, 3, 4, 5]  # Must be contiguous; read as one t_in_list range
+# PostgreSQL-style array template for one sample, e.g. {21.500,NULL,...}; NaN renders as "nan"
+CHANNELS_FORMAT = "{{" + ",".join(["{:.3f}"] * len(TEMPERATURE_CHANNELS)) + "}}"
 
 # Define data directory and row limit
 DATA_DIR = os.path.expanduser("~/data")  
 MAX_ROWS_PER_FILE = 100000  
+CSV_FLUSH_INTERVAL = 30.0  # Seconds between explicit CSV flushes
 
-def init_db():
-    """
-    Initialize and return the database connection and cursor.
-    """
-    from ida_db import pglogger
-    import psql_credentials as creds_cloud
-    try:
-        db_cloud = pglogger(creds_cloud)
-        logging.info("Database connection initialized.")
-        return db_cloud
-    except Exception as e:
-        logging.error(f"Failed to initialize database connection: {e}")
-        return None
-
-def reconnect_db():
+SAMPLE_PERIOD = 1.0  # Seconds between readings
+IO_QUEUE_SIZE = 1024  # Samples buffered between the acquisition loop and the I/O thread
+DB_BATCH_SIZE = 100  # Rows per database round-trip
+DB_FLUSH_INTERVAL = 10.0  # Seconds; flush at least this often regardless of batch size
+
+def csv_part_path(table_name, file_index):
     """
-    Attempt to reconnect to the database.
+    Path of the CSV part file with the given index, stamped with the time it is started.
     """
-    logging.warning("Attempting to reconnect to the database...")
-    try:
-        return init_db()
-    except Exception as e:
-        logging.error(f"Reconnection failed: {e}")
-        return None
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(DATA_DIR, f"{table_name}_from{timestamp}_part{file_index}.csv")
 
-def setup_csv(channels, table_name, file_index=1):
+def setup_csv(table_name):
     """
-    Setup and return a CSV writer and its associated file handle in a named tuple.
+    Setup and return the buffered CSV writer.
     Generates a new file for each batch of MAX_ROWS_PER_FILE rows.
     """
-    CsvHandle = namedtuple('CsvHandle', ['writer', 'file', 'row_count', 'file_index'])
-
     os.makedirs(DATA_DIR, exist_ok=True)  # Ensure the directory exists
-
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    filename = os.path.join(DATA_DIR, f"{table_name}_from{timestamp}_part{file_index}.csv")  # <-- Changed filename
-    csv_file = open(filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-
-    # Update column name
-    csv_writer.writerow(["time", "channels"])
-
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file, row_count=0, file_index=file_index)
+    return CsvBatchWriter(lambda file_index: csv_part_path(table_name, file_index), ["time", "channels"],
+                          max_rows=MAX_ROWS_PER_FILE, flush_interval=CSV_FLUSH_INTERVAL)
 
 def prompt_for_temp_device():
     """
@@ -94,20 +74,41 @@ def prompt_for_temp_device():
 
     print("Please enter a board number from the following:")
     for i, d in enumerate(devices):
-        name = DaqDevice(d).get_descriptor().product_name
-        id = DaqDevice(d).get_descriptor().unique_id
-        print(f"{i}) {name} ({id})")
+        # The inventory entries are already descriptors; only the chosen device gets a DaqDevice handle
+        print(f"{i}) {d.product_name} ({d.unique_id})")
     temp_index = int(input("Index of USB-TEMP Device: "))
     return DaqDevice(devices[temp_index])
 
-def read_temperatures(device: DaqDevice):
+def read_temperatures(ai_device: AiDevice, out_buf):
     """
-    Read temperatures from the specified device.
+    Read temperatures from the device's analog input subsystem into out_buf (one slot per TEMPERATURE_CHANNELS entry).
+    All channels are read with a single t_in_list call instead of one t_in round-trip per channel.
     """
-    output = {}
-    for c in TEMPERATURE_CHANNELS:
-        output[c] = device.get_ai_device().t_in(c, TempScale.CELSIUS)
-    return output
+    out_buf[:] = ai_device.t_in_list(TEMPERATURE_CHANNELS[0], TEMPERATURE_CHANNELS[-1],
+                                     TempScale.CELSIUS, TInListFlag.DEFAULT)
+    return out_buf
+
+def io_worker(io_queue, csv_handle, db_cloud):
+    """
+    Writes queued samples to CSV and hands them to the database writer so that
+    disk latency (flushes, file rotation) never delays the next reading.
+    A None item stops the worker.
+    """
+    while True:
+        item = io_queue.get()
+        if item is None:
+            break
+        now, timestamp, temperatures = item
+
+        try:
+            # Format the temperatures as a PostgreSQL-style array in one call; NaN becomes NULL
+            channels_string = CHANNELS_FORMAT.format(*temperatures.tolist()).replace("nan", "NULL")
+            # Write the formatted row to the CSV file (flushed periodically, rotated every MAX_ROWS_PER_FILE rows)
+            csv_handle.writerow([timestamp, channels_string])
+        except Exception as e:
+            logging.error(f"CSV logging failed: {e}")
+
+        db_cloud.enqueue(now, temperatures)
 
 def main():
     # Parse command-line arguments
@@ -117,78 +118,78 @@ def main():
 
     table_name = args.table  # Assign the passed table name
 
-    # Initialize database connection
-    db_cloud = init_db()
+    # Initialize the background database writer
+    db_cloud = open_db_writer(table_name, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL)
 
     # Setup CSV logging
-    file_index = 1
-    csv_handle = setup_csv(TEMPERATURE_CHANNELS, table_name, file_index)
+    csv_handle = setup_csv(table_name)
 
     # Prompt user for temperature device or auto-select if only one is available
     usb_temp = prompt_for_temp_device()
     usb_temp.connect()
+    ai_device = usb_temp.get_ai_device()  # Looked up once for the whole run
+
+    temp_buf = np.empty(len(TEMPERATURE_CHANNELS), dtype=np.float64)  # Reused for every sample
+
+    # Per-sample console output is only useful on a terminal (e.g. a tmux pane)
+    show_output = sys.stdout.isatty()
+
+    # CSV and database writes run on their own thread, fed by the acquisition loop
+    io_queue = queue.Queue(maxsize=IO_QUEUE_SIZE)
+    io_thread = threading.Thread(target=io_worker, args=(io_queue, csv_handle, db_cloud), daemon=True)
+    io_thread.start()
 
     try:
+        next_sample = time.monotonic()
         while True:
             try:
                 # Read temperature data
-                temperature_data = read_temperatures(usb_temp)
+                read_temperatures(ai_device, temp_buf)
                 
                 # Get current timestamp
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-                
-                print(f"\n\n{timestamp}")                
-                print(f"\nRaw temperature Data: {temperature_data}")
-                
-                # Replace out-of-range values with None (to be stored as NULL in PostgreSQL)
-                processed_temperatures = []
-                
-                for ch, temp in temperature_data.items():
-                    if temp < -273 or temp > 2000:
-                        #logging.info(f"Ch. {ch}: Replacing {temp} with NULL.")
-                        processed_temperatures.append(None)  # Use None instead of "NULL"
-                        print(f"  Channel {ch}: None")
-                    else:
-                        processed_temperatures.append(f"{temp:.3f}") 
-                        print(f"  Channel {ch}: {temp:.3f} C")
+                now = datetime.now()
+                timestamp = now.isoformat(' ', 'milliseconds')  # Same text as strftime('%Y-%m-%d %H:%M:%S.%f')[:-3], but cheaper
                 
-                # Write data to CSV
-                # Format the list of temperatures as a PostgreSQL-style array
-                channels_string = "{" + ",".join("NULL" if v is None else str(v) for v in processed_temperatures) + "}"
-                # Write the formatted row to the CSV file
-                csv_handle.writer.writerow([timestamp, channels_string])
+                if show_output:
+                    print(f"\n\n{timestamp}")
+                    print(f"\nRaw temperature Data: {temp_buf.tolist()}")
                 
-                csv_handle.file.flush()
-                csv_handle = csv_handle._replace(row_count=csv_handle.row_count + 1)                
-
-                if csv_handle.row_count >= MAX_ROWS_PER_FILE:
-                    logging.info(f"Reached {MAX_ROWS_PER_FILE} rows, creating a new file.")
-                    csv_handle.file.close()
-                    file_index += 1
-                    csv_handle = setup_csv(TEMPERATURE_CHANNELS, table_name, file_index)
+                # Replace out-of-range values with NaN (to be stored as NULL in PostgreSQL)
+                temp_buf[(temp_buf < -273) | (temp_buf > 2000)] = np.nan
+                np.round(temp_buf, 3, out=temp_buf)
+                if show_output:
+                    sys.stdout.write("".join(
+                        f"  Channel {ch}: None\n" if temp != temp else f"  Channel {ch}: {temp:.3f} C\n"
+                        for ch, temp in zip(TEMPERATURE_CHANNELS, temp_buf.tolist())
+                    ))
                 
-                # Log data to the database
-                temperature_array = np.array(processed_temperatures, dtype=float)  # Explicit dtype to handle None values
-                success_cloud = db_cloud.log(table=table_name, channels=temperature_array, time=timestamp)
-                if not success_cloud:
-                    logging.warning(f"Failed to log temperature data to table '{table_name}'.")
-                    db_cloud = reconnect_db()
+                # Hand a snapshot to the I/O thread, since temp_buf is reused
+                try:
+                    io_queue.put_nowait((now, timestamp, temp_buf.copy()))
+                except queue.Full:
+                    logging.warning("I/O queue full; dropping sample.")
 
             except Exception as e:
                 logging.error(f"Error during data acquisition: {e}")
-                db_cloud = reconnect_db()
 
-            # Wait for 1 second before the next reading
-            time.sleep(1)
+            # Sleep until the next deadline so the period doesn't drift with read and I/O time
+            next_sample += SAMPLE_PERIOD
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                logging.warning(f"Sample overran its {SAMPLE_PERIOD:.0f} s period by {-delay:.3f} s.")
+                next_sample = time.monotonic()  # Resynchronize instead of bursting to catch up
 
     except KeyboardInterrupt:
         logging.info("Keyboard interrupt received. Stopping data acquisition.")
     finally:
         # Cleanup resources
         usb_temp.disconnect()
-        csv_handle.file.close()
-        if db_cloud:
-            db_cloud.close()
+        io_queue.put(None)  # Let the I/O thread drain what is queued, then stop
+        io_thread.join()
+        csv_handle.close()
+        db_cloud.flush_and_close()  # Drains the queue and flushes any rows still buffered
         logging.info("Resources cleaned up and program terminated.")
 
 if __name__ == "__main__":
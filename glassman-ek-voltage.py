@@ -48,17 +48,17 @@ Database channel order:
 from __future__ import print_function
 
 import argparse
-import csv
 import logging
 import os
 import sys
 import time
-from collections import namedtuple
 from datetime import datetime
 
 import numpy as np
 import serial
 
+from libs.ida_logging import CsvBatchWriter
+
 
 # ---------------------------------------------------------------------------
 # Instrument settings
@@ -131,18 +131,14 @@ def reconnect_db():
 
 def setup_csv():
     """
-    Setup and return a CSV writer and its associated file handle.
-    """
-    CsvHandle = namedtuple("CsvHandle", ["writer", "file"])
-
-    start_time = datetime.now()
-    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_glassman_ek_voltage.csv"
+    Setup and return the buffered CSV writer.
 
-    csv_file = open(filename, "w", newline="")
-    csv_writer = csv.writer(csv_file)
+    Rows are flushed periodically and the file is synced on close, rather than
+    flushing after every poll.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-    csv_writer.writerow([
+    return CsvBatchWriter(lambda part: f"{timestamp}_glassman_ek_voltage.csv", [
         "Timestamp",
         "Voltage_kV",
         "Current_mA",
@@ -160,9 +156,6 @@ def setup_csv():
         "Raw_Response_Hex",
     ])
 
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file)
-
 
 def checksum_ascii(data):
     """
@@ -337,7 +330,7 @@ def write_csv_row(csv_handle, timestamp, data):
     """
     Write one supply reading to CSV.
     """
-    csv_handle.writer.writerow([
+    csv_handle.writerow([
         timestamp,
         data["voltage_kv"],
         data["current_ma"],
@@ -354,7 +347,6 @@ def write_csv_row(csv_handle, timestamp, data):
         data["raw_ascii"],
         data["raw_hex"],
     ])
-    csv_handle.file.flush()
 
 
 def print_reading(timestamp, data, show_raw):
@@ -520,7 +512,7 @@ def main():
             ser.close()
 
         if csv_handle is not None:
-            csv_handle.file.close()
+            csv_handle.close()
 
         if db_cloud:
             try:
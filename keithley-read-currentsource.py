@@ -3,18 +3,19 @@ import datetime
 import argparse
 import time
 import socket
+import selectors
 import serial
 import logging
-import csv
 import sys
 import os
 import threading
-from collections import namedtuple
 from libs.gpib_power_supply import GPIBPowerSupply  # Use GPIB power supply instead of KoradSerial
+from libs.ida_logging import BatchPgLogger, CsvBatchWriter
 
 # Add the parent directory (../) to the Python path
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(parent_dir)
+import psql_credentials as creds_cloud
 
 # Logging Setup
 logging.basicConfig(
@@ -26,34 +27,23 @@ logging.basicConfig(
     ]
 )
 
+SAMPLE_PERIOD = 1.0  # Seconds between readings
+CLIENT_TIMEOUT = 10  # Seconds a command client may stay idle before it is disconnected
+MIN_SET_INTERVAL = 0.1  # Seconds between current writes to the GPIB bus
+DB_BATCH_SIZE = 100  # Rows per database round-trip
+DB_FLUSH_INTERVAL = 10.0  # Seconds; flush at least this often regardless of batch size
+
 def init_db():
-    """ Initialize and return the database connection. """
-    from ida_db import pglogger
-    import psql_credentials as creds_cloud
-    try:
-        db_cloud = pglogger(creds_cloud)
-        logging.info("Database connection initialized.")
-        return db_cloud
-    except Exception as e:
-        logging.error(f"Failed to initialize database connection: {e}")
-        return None
-
-def reconnect_db():
-    """ Attempt to reconnect to the database. """
-    logging.warning("Attempting to reconnect to the database...")
-    return init_db()
+    """ Initialize and return the batched database logger (connects lazily, retries failed flushes). """
+    db_cloud = BatchPgLogger(creds_cloud, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL)
+    logging.info(f"Database logging initialized (batches of up to {DB_BATCH_SIZE} rows every {DB_FLUSH_INTERVAL:.0f} s).")
+    return db_cloud
 
 def setup_csv():
-    """ Setup and return a CSV writer and its associated file handle in a named tuple. """
-    CsvHandle = namedtuple('CsvHandle', ['writer', 'file'])
-    start_time = datetime.datetime.now()
-    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_gpib_power_data.csv"
-    csv_file = open(filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["Timestamp", "Actual Voltage (V)", "Actual Current (A)", "Power (W)", "Set Voltage (V)", "Set Current (A)"])
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file)
+    """ Setup and return the buffered CSV writer (flushed periodically, synced on close). """
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return CsvBatchWriter(lambda part: f"{timestamp}_gpib_power_data.csv",
+                          ["Timestamp", "Actual Voltage (V)", "Actual Current (A)", "Power (W)", "Set Voltage (V)", "Set Current (A)"])
 
 def try_open_port(port, gpib_address, retries=5, delay=2):
     """ Attempts to initialize the GPIB power supply with retries. """
@@ -70,46 +60,138 @@ def try_open_port(port, gpib_address, retries=5, delay=2):
                 logging.error(f"Failed to open GPIB port after {retries} attempts: {e}")
                 raise e
 
-def handle_commands(device, host='localhost', port=12345):
-    """Handles incoming current commands from clients over a socket connection."""
+def open_listener(host, port):
+    """ Create the non-blocking listening socket for the command server. """
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):  # Not available on Windows
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    s.bind((host, port))
+    s.listen()
+    s.setblocking(False)
+    return s
+
+def close_client(sel, conn):
+    """ Unregister and close a client connection. """
+    sel.unregister(conn)
+    conn.close()
+
+class CurrentSetpoint:
+    """ Latest requested current (mA); newer commands replace older ones that were not yet written. """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self.changed = threading.Event()
+
+    def set(self, current):
+        with self._lock:
+            self._value = current
+        self.changed.set()
+
+    def take(self):
+        with self._lock:
+            self.changed.clear()
+            return self._value
+
+def gpib_writer(device, setpoint):
+    """
+    Writes the latest requested current to the device, at most once per MIN_SET_INTERVAL.
+    Commands arriving in between are coalesced and values equal to the last one sent are skipped.
+    """
+    last_sent = None
     while True:
+        setpoint.changed.wait()
+        current = setpoint.take()
+        if current == last_sent:
+            continue
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                s.bind((host, port))
-                s.listen()
+            device.set_current(current)
+            last_sent = current
+            logging.info(f"Set current to: {current:.2f} mA")
+        except Exception as e:
+            logging.error(f"Failed to set current to {current:.2f} mA: {e}")
+        time.sleep(MIN_SET_INTERVAL)
+
+def serve_client(sel, conn, client, setpoint):
+    """ Read one message from a client and queue it as a current command (in mA). """
+    try:
+        data = conn.recv(1024)
+    except OSError:
+        data = b""
+    if not data:
+        logging.info(f"Client {client['addr']} disconnected.")
+        close_client(sel, conn)
+        return
+
+    client['last_seen'] = time.monotonic()
+    try:
+        current = float(data.decode())  # Interpret received data as current in mA
+        setpoint.set(current)
+        logging.debug(f"Current command from {client['addr']}: {current:.2f} mA")
+    except ValueError:
+        logging.warning(f"Invalid current data received from {client['addr']}.")
+
+def handle_commands(setpoint, host='localhost', port=12345):
+    """
+    Handles incoming current commands from clients over a socket connection.
+    The listening socket is kept for the life of the server and clients are multiplexed
+    with a selector, so a failing client never forces a rebind; only OS errors on the
+    listening socket itself recreate it. Any other error is logged and the loop carries on.
+    Commands only update setpoint; gpib_writer applies them.
+    """
+    sel = selectors.DefaultSelector()
+    server = None
+    while True:
+        try:
+            if server is None:
+                server = open_listener(host, port)
+                sel.register(server, selectors.EVENT_READ, data=None)
                 logging.info(f"Server listening for commands on {host}:{port}")
-                
-                while True:
-                    conn, addr = s.accept()
+
+            for key, _ in sel.select(timeout=1.0):
+                if key.data is None:
+                    try:
+                        conn, addr = server.accept()
+                    except (BlockingIOError, InterruptedError):
+                        continue  # Spurious wakeup or the client already went away
+                    conn.setblocking(False)
+                    sel.register(conn, selectors.EVENT_READ, data={'addr': addr, 'last_seen': time.monotonic()})
                     logging.info(f"Client connected: {addr}")
-                    with conn:
-                        conn.settimeout(10)  # Timeout for client socket
-                        while True:
-                            try:
-                                data = conn.recv(1024)
-                                if not data:
-                                    logging.info(f"Client {addr} disconnected.")
-                                    break
-                                try:
-                                    current = float(data.decode())  # Interpret received data as current in mA
-                                    device.set_current(current)
-                                    logging.info(f"Set current to: {current:.2f} mA")
-                                except ValueError:
-                                    logging.warning(f"Invalid current data received from {addr}.")
-                            except socket.timeout:
-                                logging.warning(f"Socket timeout for client {addr}. Closing connection.")
-                                break
-        except Exception as e:
+                    continue
+                try:
+                    serve_client(sel, key.fileobj, key.data, setpoint)
+                except Exception as e:
+                    logging.error(f"Error handling client {key.data['addr']}: {e}. Closing connection.")
+                    close_client(sel, key.fileobj)
+
+            # Drop clients that have gone quiet
+            now = time.monotonic()
+            for key in list(sel.get_map().values()):
+                if key.data is not None and now - key.data['last_seen'] > CLIENT_TIMEOUT:
+                    logging.warning(f"Socket timeout for client {key.data['addr']}. Closing connection.")
+                    close_client(sel, key.fileobj)
+
+        except OSError as e:
             logging.error(f"Error in handle_commands: {e}. Restarting server in 5 seconds...")
+            if server is not None:
+                if server in sel.get_map():  # not registered if setup failed half-way
+                    sel.unregister(server)
+                server.close()
+                server = None
             time.sleep(5)
+        except Exception as e:
+            logging.error(f"Unexpected error in handle_commands: {e}")
+            time.sleep(1)
 
 def start_server(device, host, port):
-    """ Starts the server in a separate thread. """
+    """ Starts the server and the GPIB writer in separate threads. """
+    setpoint = CurrentSetpoint()
+    threading.Thread(target=gpib_writer, args=(device, setpoint), daemon=True).start()
+
     def server_thread():
         try:
             logging.info("Server thread starting...")
-            handle_commands(device, host, port)
+            handle_commands(setpoint, host, port)
         except Exception as e:
             logging.error(f"Server thread error: {e}")
             return  
@@ -149,8 +231,10 @@ def main():
             server_thread = start_server(device, 'localhost', args.port)
 
             # Main loop: log data
+            next_sample = time.monotonic()
             while True:
-                current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                now = datetime.datetime.now()
+                current_time = now.isoformat(' ', 'seconds')  # Same text as strftime("%Y-%m-%d %H:%M:%S"), but cheaper
 
                 try:
                     actual_current, actual_voltage = device.get_status()
@@ -161,24 +245,30 @@ def main():
                     logging.info(f"Voltage: {actual_voltage:.2f} V, Current: {actual_current:.3f} A, Power: {power:.3f} W")
 
                     # Write to CSV
-                    csv_handle.writer.writerow([current_time, actual_voltage, actual_current, power, set_voltage, set_current])
-                    csv_handle.file.flush()
+                    csv_handle.writerow([current_time, actual_voltage, actual_current, power, set_voltage, set_current])
 
-                    # Log data to the database
+                    # Log data to the database (buffered; rows are kept and retried if a flush fails)
                     ps_array = np.array([actual_voltage, actual_current, power, set_voltage, set_current])
-                    success_cloud = db_cloud.log(args.table, channels=ps_array)
+                    success_cloud = db_cloud.log(args.table, channels=ps_array, time=now)
                     if not success_cloud:
-                        logging.warning("Failed to log power supply values to the cloud database.")
-                        db_cloud = reconnect_db()
+                        logging.warning("Failed to log power supply values to the cloud database. Will retry with the next batch.")
 
                 except Exception as e:
                     logging.error(f"An unexpected error occurred: {e}")
 
-                time.sleep(1)
+                # Sleep until the next deadline so the period doesn't drift with GPIB and I/O time
+                next_sample += SAMPLE_PERIOD
+                delay = next_sample - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    logging.warning(f"Sample overran its {SAMPLE_PERIOD:.0f} s period by {-delay:.3f} s.")
+                    next_sample = time.monotonic()  # Resynchronize instead of bursting to catch up
         finally:
             device.turn_off()
             logging.info("Device output turned off.")
-            csv_handle.file.close()
+            csv_handle.close()
+            db_cloud.close()  # Flushes any rows still buffered
 
 if __name__ == "__main__":
     main()
@@ -5,16 +5,16 @@ import time
 import socket
 import serial
 import logging
-import csv
 import sys
 import os
 import threading
-from collections import namedtuple
 from libs.koradserial import KoradSerial
+from libs.ida_logging import BatchPgLogger, CsvBatchWriter
 
 # Add the parent directory (../) to the Python path
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(parent_dir)
+import psql_credentials as creds_cloud
 
 # Logging Setup
 logging.basicConfig(
@@ -26,44 +26,41 @@ logging.basicConfig(
     ]
 )
 
+DB_BATCH_SIZE = 100  # Rows per database round-trip (one COPY)
+DB_FLUSH_INTERVAL = 30.0  # Seconds; flush at least this often regardless of batch size
+LOG_DELTA = 1e-3  # V / A; smaller changes since the last database row are not logged
+HEARTBEAT_INTERVAL = 60.0  # Seconds; log a row at least this often even when nothing changed
+
 def init_db():
     """
-    Initialize and return the database connection.
+    Initialize and return the batched database logger.
+    The logger connects lazily, writes each batch with COPY and keeps rows to retry after a failed flush.
     """
-    from ida_db import pglogger
-    import psql_credentials as creds_cloud
-    try:
-        db_cloud = pglogger(creds_cloud)
-        logging.info("Database connection initialized.")
-        return db_cloud
-    except Exception as e:
-        logging.error(f"Failed to initialize database connection: {e}")
-        return None
-
-def reconnect_db():
+    db_cloud = BatchPgLogger(creds_cloud, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL)
+    logging.info(f"Database logging initialized (batches of up to {DB_BATCH_SIZE} rows every {DB_FLUSH_INTERVAL:.0f} s).")
+    return db_cloud
+
+def readings_changed(previous, readings, tolerance=LOG_DELTA):
     """
-    Attempt to reconnect to the database.
+    True if any reading moved by more than tolerance since the previous logged row,
+    or became (or stopped being) unavailable.
     """
-    logging.warning("Attempting to reconnect to the database...")
-    try:
-        return init_db()
-    except Exception as e:
-        logging.error(f"Reconnection failed: {e}")
-        return None
+    if previous is None:
+        return True
+    for old, new in zip(previous, readings):
+        if (old is None) != (new is None):
+            return True
+        if new is not None and abs(new - old) > tolerance:
+            return True
+    return False
 
 def setup_csv():
     """
-    Setup and return a CSV writer and its associated file handle in a named tuple.
+    Setup and return the buffered CSV writer (flushed periodically, synced on close).
     """
-    CsvHandle = namedtuple('CsvHandle', ['writer', 'file'])
-    start_time = datetime.datetime.now()
-    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_power_supply_data.csv"
-    csv_file = open(filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["Timestamp", "Actual Voltage (V)", "Actual Current (A)", "Power (W)", "Set Voltage (V)", "Set Current (A)"])
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return CsvBatchWriter(lambda part: f"{timestamp}_power_supply_data.csv",
+                          ["Timestamp", "Actual Voltage (V)", "Actual Current (A)", "Power (W)", "Set Voltage (V)", "Set Current (A)"])
 
 def try_open_port(port, retries=10, delay=2):
     """Attempts to open the serial port with retries."""
@@ -80,6 +77,18 @@ def try_open_port(port, retries=10, delay=2):
                 logging.error(f"Failed to open port after {retries} attempts: {e}")
                 raise e
 
+def apply_voltage(device, message, addr):
+    """Set the output voltage from one received value."""
+    try:
+        voltage = float(message.decode())
+        if device.is_single_channel:
+            device.voltage.setpoint = voltage
+        else:
+            device.channels[0].voltage = voltage
+        logging.info(f"Set voltage to: {voltage:.2f} V")
+    except ValueError:
+        logging.warning(f"Invalid voltage data received from {addr}.")
+
 def handle_commands(device, host='localhost', port=12345):
     """Handles incoming commands from clients."""
     while True:  # Ensure the server always attempts to recover
@@ -95,24 +104,24 @@ def handle_commands(device, host='localhost', port=12345):
                     logging.info(f"Client connected: {addr}")
                     with conn:
                         conn.settimeout(10)  # Timeout for client socket
+                        buffer = b""
                         while True:
                             try:
                                 data = conn.recv(1024)
-                                if not data:
-                                    logging.info(f"Client {addr} disconnected.")
-                                    break
-                                try:
-                                    voltage = float(data.decode())
-                                    if device.is_single_channel:
-                                        device.voltage.setpoint = voltage
-                                    else:
-                                        device.channels[0].voltage = voltage
-                                    logging.info(f"Set voltage to: {voltage:.2f} V")
-                                except ValueError:
-                                    logging.warning(f"Invalid voltage data received from {addr}.")
                             except socket.timeout:
                                 logging.warning(f"Socket timeout for client {addr}. Closing connection.")
                                 break
+                            if not data:
+                                # Clients that send one unterminated value and then close are still accepted
+                                if buffer.strip():
+                                    apply_voltage(device, buffer, addr)
+                                logging.info(f"Client {addr} disconnected.")
+                                break
+                            # Values are newline-terminated; one read may hold several, or only part of one
+                            *lines, buffer = (buffer + data).split(b"\n")
+                            for line in lines:
+                                if line.strip():
+                                    apply_voltage(device, line, addr)
         except Exception as e:
             logging.error(f"Error in handle_commands: {e}. Restarting server in 5 seconds...")
             time.sleep(5)
@@ -166,35 +175,32 @@ def main():
             server_thread = start_server(device, 'localhost', args.port)
 
             # Main loop: print data to the console
+            last_logged = None  # Readings of the last row sent to the database
+            ps_buf = np.empty(5, dtype=np.float64)  # Reused for every row; log() copies the values into its buffer
+            last_logged_at = 0.0
             while True:
-                current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                now = datetime.datetime.now()
+                current_time = now.isoformat(' ', 'seconds')  # Same text as strftime("%Y-%m-%d %H:%M:%S"), but cheaper
                 try:
-                    logging.info(f"Device Model: {device.model}")
-                    
-                    if device.is_single_channel:
-                        actual_voltage = device.voltage.output
-                        actual_current = device.current.output
-                        set_voltage = device.voltage.setpoint
-                        set_current = device.current.setpoint
-                    else:
-                        actual_voltage = device.channels[0].output_voltage
-                        actual_current = device.channels[0].output_current
-                        set_voltage = device.channels[0].voltage
-                        set_current = device.channels[0].current
+                    # The model is logged once when the port is opened
+                    actual_voltage, actual_current, set_voltage, set_current = device.snapshot()
 
                     power = actual_voltage * actual_current if actual_voltage is not None and actual_current is not None else None
                     logging.info(f"Voltage: {actual_voltage:.2f} V, Current: {actual_current:.3f} A, Power: {power:.3f} W")
 
                     # Write to CSV
-                    csv_handle.writer.writerow([current_time, actual_voltage, actual_current, power, set_voltage, set_current])
-                    csv_handle.file.flush()
-
-                    # Log data to the database
-                    ps_array = np.array([actual_voltage, actual_current, power, set_voltage, set_current])
-                    success_cloud = db_cloud.log(args.table, channels=ps_array)
-                    if not success_cloud:
-                        logging.warning("Failed to log power supply values to the cloud database.")
-                        db_cloud = reconnect_db()
+                    csv_handle.writerow([current_time, actual_voltage, actual_current, power, set_voltage, set_current])
+
+                    # Log data to the database only when something changed, plus a heartbeat row
+                    # (buffered; rows are kept and retried if a flush fails). The CSV keeps every sample.
+                    readings = (actual_voltage, actual_current, set_voltage, set_current)
+                    if readings_changed(last_logged, readings) or time.monotonic() - last_logged_at >= HEARTBEAT_INTERVAL:
+                        ps_buf[:] = (actual_voltage, actual_current, power, set_voltage, set_current)  # None becomes NaN (NULL)
+                        success_cloud = db_cloud.log(args.table, channels=ps_buf, time=now)
+                        if not success_cloud:
+                            logging.warning("Failed to log power supply values to the cloud database. Will retry with the next batch.")
+                        last_logged = readings
+                        last_logged_at = time.monotonic()
 
                 except Exception as e:
                     logging.error(f"An unexpected error occurred: {e}")
@@ -203,7 +209,8 @@ def main():
         finally:
             device.output.off()
             logging.info("Device output turned off.")
-            csv_handle.file.close()
+            csv_handle.close()
+            db_cloud.close()  # Flushes any rows still buffered
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,14 @@
 from PyQt5.QtCore import QTimer
-import numpy as np
 import socket
+import select
 import argparse
+import queue
+import threading
+import ast
+import hashlib
+import json
+import os
+import operator
 from libs.fmsignal import fmsignal
 import requests
 import matplotlib
@@ -9,60 +16,238 @@ matplotlib.use('QtAgg')  # Requires PyQt5
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Button, TextBox
 
+CACHE_DIR = os.path.expanduser("~/.cache/korad")  # Downloaded signal files, keyed by URL hash
+DOWNLOAD_TIMEOUT = 10  # Seconds
+
+def write_atomically(path, text):
+    """ Write text to path through a temporary file, so a crash never leaves a partial file. """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def read_cached_doc(text_path, validators_path):
+    """ Return the cached (text, validators) pair, or None if it is missing or unreadable. """
+    try:
+        with open(validators_path, encoding='utf-8') as f:
+            validators = json.load(f)
+        with open(text_path, encoding='utf-8', newline='') as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable signal file cache: {e}")
+        for path in (text_path, validators_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return None
+    return text, validators
+
 def download_google_doc_as_text(url):
-    """Convert Google Docs URL to text-download URL and download content as text."""
+    """Convert Google Docs URL to text-download URL and download content as text.
+    The text is cached on disk; later runs send a conditional GET and reuse the cache on 304 Not Modified.
+    """
     base_url_part = url.split('/edit')[0]  # Split to remove '/edit' and any parameters after it.
     text_download_url = f"{base_url_part}/export?format=txt"
-    response = requests.get(text_download_url)
+
+    key = hashlib.sha1(text_download_url.encode()).hexdigest()
+    text_path = os.path.join(CACHE_DIR, f"{key}.txt")
+    validators_path = os.path.join(CACHE_DIR, f"{key}.json")
+
+    headers = {}
+    cached = read_cached_doc(text_path, validators_path)
+    if cached is not None:
+        validators = cached[1]
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    response = requests.get(text_download_url, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+    if response.status_code == 304 and cached is not None:
+        print("Signal file unchanged, using cached copy.")
+        return cached[0]
     response.raise_for_status()  # Raises an HTTPError for bad responses
-    return response.text
+    text = response.text
 
-def execute_instructions(text, signal):
+    validators = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+    if any(validators.values()):
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # Drop the old validators first, so a crash before the new ones are written leaves no pair behind
+            if os.path.exists(validators_path):
+                os.remove(validators_path)
+            write_atomically(text_path, text)
+            write_atomically(validators_path, json.dumps(validators))
+        except OSError as e:
+            print(f"Could not cache the signal file: {e}")
+    return text
+
+SIGNAL_METHODS = ('hold', 'ramp', 'square_ramp', 'convert_to_voltage')
+ARITHMETIC = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+              ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+              ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+def evaluate_argument(node):
+    """Evaluate a number, or plain arithmetic on numbers such as 60*60, from an instruction."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC:
+        return ARITHMETIC[type(node.op)](evaluate_argument(node.left), evaluate_argument(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in ARITHMETIC:
+        return ARITHMETIC[type(node.op)](evaluate_argument(node.operand))
+    raise ValueError(f"unsupported argument {ast.unparse(node)!r}")
+
+def parse_instructions(text):
+    """Parse each line, e.g. hold(5, until=100), once into (method name, args, kwargs)."""
     text = text.lstrip('\ufeff')
-    lines = text.strip().split('\n')
-    for line in lines:
-        exec(f'signal.{line}')
+    program = []
+    for lineno, line in enumerate(text.strip().split('\n'), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            call = ast.parse(line, mode='eval').body
+            if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id in SIGNAL_METHODS):
+                raise ValueError(f"expected one of {', '.join(SIGNAL_METHODS)}")
+            args = [evaluate_argument(arg) for arg in call.args]
+            kwargs = {kw.arg: evaluate_argument(kw.value) for kw in call.keywords}
+        except (SyntaxError, ValueError, ArithmeticError) as e:
+            raise ValueError(f"Invalid instruction on line {lineno}: {line!r} ({e})") from e
+        program.append((call.func.id, args, kwargs))
+    return program
+
+def execute_instructions(text, signal):
+    for name, args, kwargs in parse_instructions(text):
+        getattr(signal, name)(*args, **kwargs)
 
 def generate_voltage_profile(signal):
-    t = np.arange(len(signal.get_array()))
-    voltage = signal.get_array()
-    return t, voltage
+    # One value per 1 s step; the step index is the time axis, so no separate t array is built
+    return signal.get_array()
 
 running = False
 text_box = None
+background = None  # Figure pixels without the moving artists, for blitting
+
+def moving_artists(pointer, time_text):
+    """ Artists that change every tick; everything else is drawn once into the cached background. """
+    return (pointer, time_text, text_box.text_disp)
+
+def capture_background(fig, artists):
+    """ Cache the static figure after every full redraw (first show, resize, typing), then draw the moving artists on top. """
+    global background
+    background = fig.canvas.copy_from_bbox(fig.bbox)
+    for artist in artists:
+        artist.axes.draw_artist(artist)
 
-def plot_profile(t, voltage, initial_t_value, doc_url):
+def blit_artists(fig, artists):
+    """ Redraw only the moving artists over the cached background instead of the whole profile. """
+    if background is None:
+        fig.canvas.draw_idle()  # Not shown yet; the draw_event handler caches the background
+        return
+    fig.canvas.restore_region(background)
+    for artist in artists:
+        artist.axes.draw_artist(artist)
+    fig.canvas.blit(fig.bbox)
+
+def plot_profile(voltage, initial_t_value, doc_url):
     fig, ax = plt.subplots()
     plt.subplots_adjust(bottom=0.35)
-    line, = ax.plot(t, voltage, label='Voltage Profile')
+    line, = ax.plot(voltage, label='Voltage Profile')  # x defaults to the step index
     ax.set_xlabel('Time (s)')
     ax.set_ylabel('Voltage (V)')
     plt.title('Preview Voltage Profile')
     
-    start_index = np.abs(t - initial_t_value).argmin()
-    pointer, = ax.plot([t[start_index]], [voltage[start_index]], 'ro', label='Current Position')
-    time_text = ax.text(0.05, 0.95, 'Time: {:.2f}s'.format(t[start_index]), transform=ax.transAxes)
+    # Time is the 0, 1, 2, ... step index, so the closest step is just the rounded start time
+    start_index = max(0, min(len(voltage) - 1, int(round(initial_t_value))))
+    pointer, = ax.plot([start_index], [voltage[start_index]], 'ro', label='Current Position', animated=True)
+    time_text = ax.text(0.05, 0.95, 'Time: {:.2f}s'.format(start_index), transform=ax.transAxes, animated=True)
     
     axbox = plt.axes([0.25, 0.05, 0.15, 0.05])
     global text_box
     text_box = TextBox(axbox, 'Set Voltage:', initial=str(voltage[start_index]))
+    text_box.text_disp.set_animated(True)
+
+    artists = moving_artists(pointer, time_text)
+    fig.canvas.mpl_connect('draw_event', lambda event: capture_background(fig, artists))
 
     # Display the document URL on the plot
     ax.text(0.5, 0.01, f'Document URL: {doc_url}', transform=ax.transAxes, fontsize=6, ha='center', color='gray')
 
     return fig, ax, line, pointer, time_text, start_index
 
-def send_voltage(voltage, port):
-    """ Send the new voltage value to the power supply control script. """
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect(('localhost', port))
-            s.sendall(str(voltage).encode())
-            print(f"Voltage {voltage} sent to port {port}.")
-    except Exception as e:
-        print(f"Failed to send voltage due to: {str(e)}")
+class VoltageSender:
+    """ Persistent connection to the power supply control script, reopened after an error. """
+    def __init__(self, port, host='localhost'):
+        self.address = (host, port)
+        self.sock = None
+
+    def _connect(self):
+        self.sock = socket.create_connection(self.address, timeout=5)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _peer_closed(self):
+        # The control script drops idle clients; notice that before writing into a dead connection
+        readable, _, _ = select.select([self.sock], [], [], 0)
+        if not readable:
+            return False
+        try:
+            return self.sock.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
 
-def update_profile(timer, t, voltage, pointer, time_text, port, fig):
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def send(self, voltage):
+        """ Send the new voltage value (one line per value), reconnecting once if needed. """
+        message = f"{voltage}\n".encode()
+        for attempt in range(2):
+            try:
+                if self.sock is not None and self._peer_closed():
+                    self.close()
+                if self.sock is None:
+                    self._connect()
+                self.sock.sendall(message)
+                print(f"Voltage {voltage} sent to port {self.address[1]}.")
+                return True
+            except OSError as e:
+                self.close()
+                error = e
+        print(f"Failed to send voltage due to: {str(error)}")
+        return False
+
+SEND_QUEUE_SIZE = 8  # Voltage updates waiting for the sender thread
+
+def sender_worker(send_queue, sender):
+    """
+    Sends queued voltages over the persistent connection, so network latency never
+    stalls the Qt event loop. A None item stops the worker.
+    """
+    while True:
+        voltage = send_queue.get()
+        if voltage is None:
+            break
+        sender.send(voltage)
+    sender.close()
+
+def queue_voltage(send_queue, voltage):
+    """ Hand a voltage to the sender thread without blocking; drops the oldest update when full. """
+    while True:
+        try:
+            send_queue.put_nowait(voltage)
+            return
+        except queue.Full:
+            try:
+                send_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+def update_profile(timer, voltage, pointer, time_text, send_queue, fig):
     global running
     if not running or not plt.fignum_exists(fig.number):
         timer.stop()
@@ -71,16 +256,16 @@ def update_profile(timer, t, voltage, pointer, time_text, port, fig):
     try:
         # Move to the next point
         current_index = update_profile.current_index
-        if current_index >= len(t):
+        if current_index >= len(voltage):
             timer.stop()
             print("Profile execution completed.")
             return
 
-        pointer.set_data([t[current_index]], [voltage[current_index]])
-        time_text.set_text(f'Time: {t[current_index]:.2f}s')
-        text_box.set_val(f"{voltage[current_index]:.2f}")
-        send_voltage(voltage[current_index], port)
-        fig.canvas.draw_idle()
+        pointer.set_data([current_index], [voltage[current_index]])
+        time_text.set_text(f'Time: {current_index:.2f}s')
+        text_box.text_disp.set_text(f"{voltage[current_index]:.2f}")  # set_val would trigger a full redraw
+        queue_voltage(send_queue, voltage[current_index])
+        blit_artists(fig, moving_artists(pointer, time_text))
         update_profile.current_index += 1
     except Exception as e:
         print(f"Error during profile update: {e}")
@@ -98,10 +283,10 @@ def on_pause(event):
     global running
     running = False
 
-def on_send(event, port):
+def on_send(event, send_queue):
     new_voltage = float(text_box.text)
     print(f"Manually sending voltage: {new_voltage}")
-    send_voltage(new_voltage, port)
+    queue_voltage(send_queue, new_voltage)
 
 def main():
     parser = argparse.ArgumentParser(description="Control and display voltage profile from a signal file.")
@@ -114,8 +299,8 @@ def main():
     signal = fmsignal()
     execute_instructions(doc_text, signal)
 
-    t, voltage = generate_voltage_profile(signal)
-    fig, ax, line, pointer, time_text, start_index = plot_profile(t, voltage, args.start, args.signalfile)
+    voltage = generate_voltage_profile(signal)
+    fig, ax, line, pointer, time_text, start_index = plot_profile(voltage, args.start, args.signalfile)
     update_profile.current_index = start_index
 
     start_ax = plt.axes([0.81, 0.05, 0.1, 0.075])
@@ -126,14 +311,21 @@ def main():
     pause_button = Button(pause_ax, 'Pause')
     send_button = Button(send_ax, 'Send Voltage')
 
+    # Socket writes run on their own thread, fed by the timer and the Send button
+    send_queue = queue.Queue(maxsize=SEND_QUEUE_SIZE)
+    send_thread = threading.Thread(target=sender_worker, args=(send_queue, VoltageSender(args.port)), daemon=True)
+    send_thread.start()
+
     timer = QTimer()
-    timer.timeout.connect(lambda: update_profile(timer, t, voltage, pointer, time_text, args.port, fig))
+    timer.timeout.connect(lambda: update_profile(timer, voltage, pointer, time_text, send_queue, fig))
 
     start_button.on_clicked(lambda event: on_start(event, timer))
     pause_button.on_clicked(on_pause)
-    send_button.on_clicked(lambda event: on_send(event, args.port))
+    send_button.on_clicked(lambda event: on_send(event, send_queue))
 
     plt.show()
+    queue_voltage(send_queue, None)  # Let the sender thread finish what is queued, then stop
+    send_thread.join()
 
 if __name__ == "__main__":
     main()
@@ -3,8 +3,37 @@ from matplotlib import pyplot as plt
 
 class fmsignal:
     def __init__(self):
-        """Initialize an empty signal array."""
-        self.signal = np.array([])
+        """Initialize an empty signal.
+        Segments are collected in a list and only concatenated when the array is needed.
+        """
+        self._length = 0
+        self._segments = []
+        self._signal_cache = np.array([])
+
+    def _reserve(self, duration):
+        """Return a writable array for the next duration samples."""
+        segment = np.empty(duration, dtype=np.float64)
+        self._segments.append(segment)
+        self._signal_cache = None
+        self._length += duration
+        return segment
+
+    @staticmethod
+    def _linspace_into(out, startvalue, endvalue):
+        """Fill out with evenly spaced values from startvalue to endvalue, like np.linspace."""
+        n = len(out)
+        np.multiply(np.arange(n), (endvalue - startvalue) / (n - 1) if n > 1 else 0.0, out=out)
+        out += startvalue
+        if n > 1:
+            out[-1] = endvalue
+        return out
+
+    @property
+    def signal(self):
+        """The whole signal as one numpy array (concatenated once per change)."""
+        if self._signal_cache is None:
+            self._signal_cache = np.concatenate(self._segments)
+        return self._signal_cache
 
     def hold(self, value, duration=None, until=None):
         """Append a hold (constant value) to the signal.
@@ -12,20 +41,17 @@ class fmsignal:
         """
         if duration is not None:
             duration = int(duration)  
-            constant_segment = np.full(duration, value)
         elif until is not None:
-            if until <= len(self.signal):
+            if until <= self._length:
                 return  # If 'until' is less than current length, do nothing
-            duration = until - len(self.signal)
-            constant_segment = np.full(duration, value)
+            duration = until - self._length
         else:
             raise ValueError("Either 'duration' or 'until' must be specified for hold.")
-        self.signal = np.concatenate([self.signal, constant_segment])
+        self._reserve(duration).fill(value)
 
     def ramp(self, startvalue, endvalue, duration):
         """Append a ramp (linear change) to the signal."""
-        ramp_segment = np.linspace(startvalue, endvalue, num=duration)
-        self.signal = np.concatenate([self.signal, ramp_segment])
+        self._linspace_into(self._reserve(duration), startvalue, endvalue)
 
     def plot(self):
         """Plot the signal."""
@@ -44,10 +70,11 @@ class fmsignal:
 
     def square_ramp(self, startvalue, endvalue, duration):
         """Append a square ramp based on a square root function."""
-        # Generate the square ramp using a square root function
-        time_points = np.linspace(0, 1, duration)  # Normalized time points (0 to 1)
-        square_segment = np.sqrt(time_points) * (endvalue - startvalue) + startvalue
-        self.signal = np.concatenate([self.signal, square_segment])
+        # Generate the square ramp using a square root function, in place
+        square_segment = self._linspace_into(self._reserve(duration), 0.0, 1.0)  # Normalized time points (0 to 1)
+        np.sqrt(square_segment, out=square_segment)
+        square_segment *= endvalue - startvalue
+        square_segment += startvalue
 
     def convert_to_voltage(self):
         """Convert a linear ramp (assumed to be temperatures) into corresponding voltage values."""
@@ -58,10 +85,13 @@ class fmsignal:
         # Assume resistance is 1 Ohm
         resistance = 1  # Ohms
 
-        # Convert temperature to power
-        power_signal = (self.signal - intercept) / slope
+        # Convert temperature to power (one output array, updated in place from here on)
+        voltage_signal = np.subtract(self.signal, intercept, dtype=float)
+        voltage_signal /= slope
 
         # Convert power to voltage, ensuring no negative power
-        voltage_signal = np.sqrt(np.maximum(power_signal * resistance, 0))
+        voltage_signal *= resistance
+        np.maximum(voltage_signal, 0, out=voltage_signal)
+        np.sqrt(voltage_signal, out=voltage_signal)
 
         return voltage_signal
@@ -1,16 +1,53 @@
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.auth.exceptions import RefreshError
-import pandas as pd
+from google_auth_httplib2 import AuthorizedHttp
+import google.auth
+import httplib2
+import csv
+import json
 import time
+import random
 import os
 import threading
-from queue import Queue
+import logging
+from queue import Queue, Full
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from google.colab import auth
 
-# Initialize drive_service as None
-drive_service = None
+logger = logging.getLogger(__name__)
+
+# Keep the authenticated service when the module is reloaded (e.g. importlib.reload in Colab)
+drive_service = globals().get('drive_service')
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Resolved folder IDs, keyed by "parent_folder_id/path" and kept on disk between runs
+CACHE_ROOT = os.path.expanduser('~/.cache/ida-devices')
+FOLDER_ID_CACHE_PATH = os.path.join(CACHE_ROOT, 'folder_ids.json')
+NOT_FOUND_TTL = 60  # Seconds a failed lookup is remembered, so a mistyped path is not retried in a loop
+_folder_id_cache = globals().get('_folder_id_cache')
+_not_found = {}  # cache key -> time of the failed lookup
+_folder_id_lock = threading.Lock()
+
+class FolderNotFoundError(Exception):
+    """A folder in the requested path does not exist."""
+
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive']
+HTTP_CACHE_DIR = os.path.join(CACHE_ROOT, 'http')  # httplib2 response cache, lets repeated requests be answered with 304 Not Modified
+
+def build_drive_service(cache=True):
+    """
+    Build a Drive service, on a caching HTTP client unless cache is False.
+    httplib2 already asks for gzip responses; the discovery document is loaded from the
+    copy bundled with googleapiclient instead of being downloaded.
+    The httplib2 file cache is not safe for concurrent writers, so only the main
+    service uses it.
+    """
+    credentials, _ = google.auth.default(scopes=DRIVE_SCOPES)
+    http = AuthorizedHttp(credentials, http=httplib2.Http(cache=HTTP_CACHE_DIR if cache else None))
+    return build('drive', 'v3', http=http, static_discovery=True, cache_discovery=False)
 
 def initialize_drive_service():
     """Initialize or reinitialize the Google Drive service after authentication."""
@@ -18,7 +55,7 @@ def initialize_drive_service():
     try:
         print("Authenticating user for Google Drive API...")
         auth.authenticate_user()  # Force Colab authentication
-        drive_service = build('drive', 'v3')
+        drive_service = build_drive_service()
         print("Drive service initialized successfully.")
     except Exception as e:
         print(f"Failed to initialize Drive service: {e}")
@@ -34,9 +71,118 @@ def prompt_for_auth(error_message):
     print("After authentication, rerun the function.")
     raise SystemExit
 
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 6
+MAX_BACKOFF = 64  # Seconds
+
+def is_retryable(error):
+    """True for rate-limit and server errors that are worth retrying."""
+    return isinstance(error, HttpError) and error.resp.status in RETRY_STATUSES
+
+def backoff_delay(error, attempt):
+    """Seconds to wait before retry number attempt: Retry-After if given, else exponential with jitter."""
+    try:
+        return float(error.resp.get('retry-after'))
+    except (TypeError, ValueError):
+        return min(2 ** attempt + random.random(), MAX_BACKOFF)
+
+def execute_with_retry(request, max_retries=MAX_RETRIES):
+    """
+    Execute a Drive API request, retrying rate-limit and server errors.
+    Waits as long as the Retry-After header asks, or else backs off exponentially with jitter.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return request.execute()
+        except HttpError as e:
+            if not is_retryable(e) or attempt == max_retries:
+                raise
+            time.sleep(backoff_delay(e, attempt))
+
+def folder_cache_key(parent_folder_id, parts):
+    """Key of a resolved path in the folder ID cache (Drive IDs never contain '/')."""
+    return '/'.join([parent_folder_id] + parts)
+
+def folder_id_cache():
+    """Return the folder ID cache, loading it from disk on first use."""
+    global _folder_id_cache
+    if _folder_id_cache is None:
+        try:
+            with open(FOLDER_ID_CACHE_PATH) as f:
+                _folder_id_cache = json.load(f)
+        except (OSError, ValueError):
+            _folder_id_cache = {}
+    return _folder_id_cache
+
+def save_folder_id_cache():
+    """Write the folder ID cache to disk; failures only cost a lookup on the next run."""
+    try:
+        os.makedirs(os.path.dirname(FOLDER_ID_CACHE_PATH), exist_ok=True)
+        tmp_path = f"{FOLDER_ID_CACHE_PATH}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(_folder_id_cache, f)
+        os.replace(tmp_path, FOLDER_ID_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: Could not save folder ID cache to {FOLDER_ID_CACHE_PATH}: {e}")
+
+def remember_folder_ids(folder_ids):
+    """Add resolved {cache key: folder ID} entries to the cache and save it."""
+    with _folder_id_lock:
+        folder_id_cache().update(folder_ids)
+        save_folder_id_cache()
+
+def forget_folder_id(folder_id):
+    """Drop every cached path that resolved to folder_id (e.g. after the folder was deleted)."""
+    with _folder_id_lock:
+        cache = folder_id_cache()
+        stale = [key for key, value in cache.items() if value == folder_id]
+        for key in stale:
+            del cache[key]
+        if stale:
+            save_folder_id_cache()
+
+def quote_query_value(value):
+    """Quote a string literal for use in a Drive query."""
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def resolve_path_in_one_query(parent_folder_id, parts):
+    """
+    Resolve a folder path with a single Drive query.
+
+    All folders named like one of the path parts are fetched at once, and the chain is
+    rebuilt locally by following parent links from parent_folder_id.
+
+    Returns:
+        The ID of the target folder, or None if the chain is missing, ambiguous or the
+        result did not fit in one page (the caller then walks the path folder by folder).
+    """
+    names = " or ".join(f"name = {quote_query_value(part)}" for part in sorted(set(parts)))
+    response = execute_with_retry(drive_service.files().list(
+        q=f"({names}) and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false",
+        spaces='drive',
+        fields='nextPageToken, incompleteSearch, files(id, name, parents)',
+        pageSize=1000,
+        supportsAllDrives=True,
+        includeItemsFromAllDrives=True
+    ))
+    if response.get('nextPageToken') or response.get('incompleteSearch'):
+        return None
+
+    candidates = response.get('files', [])
+    current_folder_id = parent_folder_id
+    for part in parts:
+        matches = [f['id'] for f in candidates if f['name'] == part and current_folder_id in f.get('parents', [])]
+        if len(matches) != 1:
+            return None
+        current_folder_id = matches[0]
+    return current_folder_id
+
 def get_folder_id(parent_folder_id, path):
     """
     Get the folder ID by traversing a relative path from a parent folder ID.
+
+    The path is resolved with one query where possible, falling back to one query per
+    path part. Resolved IDs are cached on disk, paths that were not found for NOT_FOUND_TTL seconds.
     
     Args:
         parent_folder_id: The ID of the parent folder to start from.
@@ -47,7 +193,8 @@ def get_folder_id(parent_folder_id, path):
     
     Raises:
         ValueError: If the parent_folder_id or path is invalid.
-        Exception: If a folder in the path is not found or other API errors occur.
+        FolderNotFoundError: If a folder in the path is not found.
+        Exception: If other API errors occur.
     """
     global drive_service
     if drive_service is None:
@@ -59,27 +206,61 @@ def get_folder_id(parent_folder_id, path):
     if not path or not isinstance(path, str):
         raise ValueError(f"Invalid path: {path}")
     
+    parts = [part for part in path.strip('/').split('/') if part]  # Skip empty path parts
+    if not parts:
+        return parent_folder_id
+    key = folder_cache_key(parent_folder_id, parts)
+    cached = folder_id_cache().get(key)
+    if cached is not None:
+        return cached
+    if time.time() - _not_found.get(key, float('-inf')) < NOT_FOUND_TTL:
+        raise FolderNotFoundError(f"Folder '{path}' not found in parent folder ID '{parent_folder_id}' (checked less than {NOT_FOUND_TTL} s ago).")
+
+    try:
+        folder_id = resolve_path_in_one_query(parent_folder_id, parts)
+    except (HttpError, RefreshError) as e:
+        if isinstance(e, HttpError) and e.resp.status in [401, 403]:  # Unauthorized or Forbidden
+            prompt_for_auth(f"HTTP Error {e.resp.status}: {e}")
+        elif isinstance(e, RefreshError):
+            prompt_for_auth(f"Credential refresh failed: {e}")
+        folder_id = None  # Any other error: the folder-by-folder walk below reports it
+    if folder_id is None:
+        try:
+            folder_id = walk_folder_path(parent_folder_id, parts)
+        except FolderNotFoundError:
+            _not_found[key] = time.time()
+            raise
+    else:
+        print(f"Found folder '{path}' with ID '{folder_id}'.")
+
+    _not_found.pop(key, None)
+    remember_folder_ids({key: folder_id})
+    return folder_id
+
+def walk_folder_path(parent_folder_id, parts):
+    """
+    Resolve a folder path with one query per path part.
+    
+    Raises:
+        FolderNotFoundError: If a folder in the path is not found.
+        Exception: If other API errors occur.
+    """
     current_folder_id = parent_folder_id
-    parts = path.strip('/').split('/')
     for part in parts:
-        if not part:  # Skip empty path parts
-            continue
-        print(f"Searching for folder '{part}' in parent folder ID '{current_folder_id}'...")
         try:
-            response = drive_service.files().list(
-                q=f"'{current_folder_id}' in parents and name = '{part}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false",
+            response = execute_with_retry(drive_service.files().list(
+                q=f"{quote_query_value(current_folder_id)} in parents and name = {quote_query_value(part)} and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false",
                 spaces='drive',
                 fields='files(id, name)',
                 supportsAllDrives=True,
                 includeItemsFromAllDrives=True
-            ).execute()
+            ))
             files = response.get('files', [])
             if not files:
-                raise Exception(f"Folder '{part}' not found in parent folder ID '{current_folder_id}'.")
+                raise FolderNotFoundError(f"Folder '{part}' not found in parent folder ID '{current_folder_id}'.")
             if len(files) > 1:
                 print(f"Warning: Multiple folders named '{part}' found in parent ID '{current_folder_id}'. Using the first one.")
             current_folder_id = files[0]['id']
-            print(f"Found folder '{part}' with ID '{current_folder_id}'.")
         except (HttpError, RefreshError) as e:
             if isinstance(e, HttpError) and e.resp.status in [401, 403]:  # Unauthorized or Forbidden
                 prompt_for_auth(f"HTTP Error {e.resp.status}: {e}")
@@ -89,34 +270,188 @@ def get_folder_id(parent_folder_id, path):
                 raise Exception(f"Error accessing folder '{part}' in parent ID '{current_folder_id}': {e}")
     return current_folder_id
 
-def get_folder_contents(folder_id, subfolders=False, save_to_csv=False, output_csv='all_files.csv'):
+BATCH_LIMIT = 100  # Maximum sub-requests per Drive batch call
+
+def get_folder_ids(parent_folder_id, paths):
     """
-    List files or subfolders inside a Drive folder, with optional CSV saving.
-    
+    Resolve several relative paths from the same parent folder with batched requests.
+
+    Paths are resolved level by level: all lookups for one path depth are packed into
+    batch calls of up to BATCH_LIMIT sub-requests, so n paths of depth d cost about
+    d * ceil(n / BATCH_LIMIT) HTTP round-trips instead of n * d.
+
     Args:
-        folder_id (str): The ID of the folder to list contents from.
-        subfolders (bool): If True, list subfolders; if False, list files (default: False).
-        save_to_csv (bool): If True, save results to a CSV file (default: False).
-        output_csv (str): Path to the output CSV file (default: 'all_files.csv').
-    
+        parent_folder_id: The ID of the parent folder to start from.
+        paths: Relative paths to the target folders.
+
     Returns:
-        list: A list of file or subfolder names.
+        dict: Mapping of each path to its folder ID.
+
+    Raises:
+        FolderNotFoundError: If a folder in one of the paths is not found.
+        Exception: If other API errors occur.
     """
     global drive_service
     if drive_service is None:
         initialize_drive_service()
+
+    if not parent_folder_id or not isinstance(parent_folder_id, str):
+        raise ValueError(f"Invalid parent_folder_id: {parent_folder_id}")
+
+    # path -> (cache key, remaining parts, folder ID reached so far)
+    pending = {}
+    result = {}
+    for path in paths:
+        if not path or not isinstance(path, str):
+            raise ValueError(f"Invalid path: {path}")
+        parts = [part for part in path.strip('/').split('/') if part]
+        key = folder_cache_key(parent_folder_id, parts)
+        cached = folder_id_cache().get(key)
+        if cached is not None:
+            result[path] = cached
+        elif time.time() - _not_found.get(key, float('-inf')) < NOT_FOUND_TTL:
+            raise FolderNotFoundError(f"Folder '{path}' not found in parent folder ID '{parent_folder_id}' (checked less than {NOT_FOUND_TTL} s ago).")
+        else:
+            pending[path] = (key, parts, parent_folder_id)
+
+    resolved = {}
+    while pending:
+        # One lookup per distinct (folder, name) pair at this depth
+        lookups = sorted({(folder_id, parts[0]) for _, parts, folder_id in pending.values() if parts})
+        found = {}
+        attempt = 0
+        while lookups:
+            errors = []
+
+            def collect(lookup, response, exception):
+                if exception is not None:
+                    errors.append((lookup, exception))
+                else:
+                    found[lookup] = response.get('files', [])
+
+            for start in range(0, len(lookups), BATCH_LIMIT):
+                batch = drive_service.new_batch_http_request()
+                for lookup in lookups[start:start + BATCH_LIMIT]:
+                    folder_id, part = lookup
+                    batch.add(
+                        drive_service.files().list(
+                            q=f"{quote_query_value(folder_id)} in parents and name = {quote_query_value(part)} and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false",
+                            spaces='drive',
+                            fields='files(id, name)',
+                            supportsAllDrives=True,
+                            includeItemsFromAllDrives=True
+                        ),
+                        callback=lambda request_id, response, exception, lookup=lookup: collect(lookup, response, exception)
+                    )
+                try:
+                    execute_with_retry(batch)
+                except (HttpError, RefreshError) as e:
+                    errors.append(((parent_folder_id, 'batch request'), e))
+
+            # Sub-requests that hit a rate-limit or server error go into the next batch after a backoff
+            # (a failed batch call as a whole was already retried by execute_with_retry)
+            retry = {lookup: e for lookup, e in errors if is_retryable(e) and lookup[1] != 'batch request'}
+            if attempt == MAX_RETRIES:
+                retry = {}
+            for (folder_id, part), e in errors:
+                if (folder_id, part) in retry:
+                    continue
+                if isinstance(e, HttpError) and e.resp.status in [401, 403]:  # Unauthorized or Forbidden
+                    prompt_for_auth(f"HTTP Error {e.resp.status}: {e}")
+                elif isinstance(e, RefreshError):
+                    prompt_for_auth(f"Credential refresh failed: {e}")
+                else:
+                    raise Exception(f"Error accessing folder '{part}' in parent ID '{folder_id}': {e}")
+            if retry:
+                time.sleep(max(backoff_delay(e, attempt) for e in retry.values()))
+                attempt += 1
+            lookups = sorted(retry)
+
+        next_pending = {}
+        for path, (key, parts, folder_id) in pending.items():
+            if not parts:
+                result[path] = folder_id
+                resolved[key] = folder_id
+                _not_found.pop(key, None)
+                continue
+            files = found[(folder_id, parts[0])]
+            if not files:
+                _not_found[key] = time.time()
+                raise FolderNotFoundError(f"Folder '{parts[0]}' not found in parent folder ID '{folder_id}'.")
+            if len(files) > 1:
+                print(f"Warning: Multiple folders named '{parts[0]}' found in parent ID '{folder_id}'. Using the first one.")
+            next_pending[path] = (key, parts[1:], files[0]['id'])
+        pending = next_pending
+
+    if resolved:
+        remember_folder_ids(resolved)
+    return result
+
+REQUEST_RATE = 10.0  # Drive requests per second, shared by all listing threads
+LIST_WORKERS = 8  # Concurrent folder listings; more mostly trades speed for 429 errors
+
+class Pacer:
+    """
+    Token bucket limiting the Drive request rate across threads.
+    Tokens are added for the time elapsed since the last request, up to burst;
+    each request takes one, waiting if none is left. No background thread is needed.
+    """
+    def __init__(self, rate=REQUEST_RATE, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # May go negative: later callers queue up behind this one
+            delay = -self.tokens / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+_pacer = None
+_thread_local = threading.local()
+
+def get_pacer():
+    """Return the shared Pacer, creating it on first use."""
+    global _pacer
+    if _pacer is None:
+        _pacer = Pacer()
+    return _pacer
+
+def thread_drive_service():
+    """Return a Drive service for the calling thread (the underlying HTTP client is not thread-safe)."""
+    if threading.current_thread() is threading.main_thread():
+        return drive_service
+    if getattr(_thread_local, 'service', None) is None:
+        _thread_local.service = build_drive_service(cache=False)
+    return _thread_local.service
+
+PROGRESS_EVERY = 10  # Pages between progress messages unless verbose
+
+def iter_folder_pages(service, folder_id, subfolders=False, verbose=False):
+    """
+    Page through the files or subfolders of one folder.
     
+    Yields:
+        list: The file or subfolder names of each page.
+    """
     content_type = "subfolders" if subfolders else "files"
-    mime_type_filter = "mimeType = 'application/vnd.google-apps.folder'" if subfolders else "mimeType != 'application/vnd.google-apps.folder'"
+    mime_type_filter = f"mimeType = '{FOLDER_MIME_TYPE}'" if subfolders else f"mimeType != '{FOLDER_MIME_TYPE}'"
+    pacer = get_pacer()
     page_token = None
     batch_count = 0
     total_items = 0
-    all_contents = []
     
-    print(f"Fetching {content_type}...")
     while True:
         try:
-            response = drive_service.files().list(
+            pacer.acquire()
+            response = execute_with_retry(service.files().list(
                 q=f"'{folder_id}' in parents and {mime_type_filter} and trashed = false",
                 spaces='drive',
                 fields='nextPageToken, files(name)',
@@ -124,46 +459,167 @@ def get_folder_contents(folder_id, subfolders=False, save_to_csv=False, output_c
                 pageToken=page_token,
                 supportsAllDrives=True,
                 includeItemsFromAllDrives=True
-            ).execute()
-            files = response.get('files', [])
-            if not files and batch_count == 0 and not page_token:
-                break
-            batch = [f['name'] for f in files]
-            if batch:
-                all_contents.extend(batch)
-            batch_count += 1
-            total_items += len(batch)
-            if files:
-                print(f"Batch {batch_count}: Got {len(batch)} {content_type} (Total: {total_items})")
-            page_token = response.get('nextPageToken')
-            if not page_token:
-                if total_items > 0:
-                    print(f"Found {total_items} {content_type}.")
-                break
-            time.sleep(0.5)
+            ))
         except (HttpError, RefreshError) as e:
             if isinstance(e, HttpError) and e.resp.status in [401, 403]:  # Unauthorized or Forbidden
                 prompt_for_auth(f"HTTP Error {e.resp.status}: {e}")
             elif isinstance(e, RefreshError):
                 prompt_for_auth(f"Credential refresh failed: {e}")
             else:
+                if isinstance(e, HttpError) and e.resp.status == 404:  # Folder gone; a cached ID for it is stale
+                    forget_folder_id(folder_id)
                 raise Exception(f"Error listing {content_type}: {e}")
+        files = response.get('files', [])
+        if not files and batch_count == 0 and not page_token:
+            break
+        batch = [f['name'] for f in files]
+        batch_count += 1
+        total_items += len(batch)
+        if files:
+            if verbose or batch_count % PROGRESS_EVERY == 0:
+                logger.info(f"Batch {batch_count}: Got {len(batch)} {content_type} (Total: {total_items})")
+            yield batch
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            if total_items > 0:
+                logger.info(f"Found {total_items} {content_type} in {batch_count} pages.")
+            break
+
+def list_folder(service, folder_id, subfolders=False, verbose=False):
+    """
+    List the files or subfolders of one folder.
     
-    if total_items == 0:
-        print(f"No {content_type} found in the specified folder.")
+    Returns:
+        list: A list of file or subfolder names.
+    """
+    all_contents = []
+    for batch in iter_folder_pages(service, folder_id, subfolders, verbose):
+        all_contents.extend(batch)
+    return all_contents
+
+PREFETCH_PAGES = 2  # Pages fetched ahead of the CSV writer
+PREFETCH_PUT_TIMEOUT = 0.5  # Seconds between checks whether the consumer has stopped
+
+def prefetch_folder_pages(service, folder_id, subfolders=False, verbose=False):
+    """
+    Like iter_folder_pages, but the next pages are fetched on a background thread
+    while the caller is still processing the current one. Closing the generator early
+    (or an error in the caller) stops the background thread.
+    """
+    pages = Queue(maxsize=PREFETCH_PAGES)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        """Queue item unless the consumer has gone away; returns False once it has."""
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=PREFETCH_PUT_TIMEOUT)
+                return True
+            except Full:
+                pass
+        return False
+
+    def producer():
+        try:
+            for batch in iter_folder_pages(service, folder_id, subfolders, verbose):
+                if not put(batch):
+                    return
+            put(done)
+        except BaseException as e:  # Includes the SystemExit raised by prompt_for_auth
+            put(e)
+
+    threading.Thread(target=producer, daemon=True).start()
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+def get_folder_contents(folder_id, subfolders=False, save_to_csv=False, output_csv='all_files.csv', verbose=False):
+    """
+    List files or subfolders inside a Drive folder, with optional CSV saving.
+    With save_to_csv, each page is written while the next one is being fetched.
+    
+    Args:
+        folder_id (str): The ID of the folder to list contents from.
+        subfolders (bool): If True, list subfolders; if False, list files (default: False).
+        save_to_csv (bool): If True, save results to a CSV file (default: False).
+        output_csv (str): Path to the output CSV file (default: 'all_files.csv').
+        verbose (bool): If True, log every page instead of every PROGRESS_EVERY pages (default: False).
+    
+    Returns:
+        list: A list of file or subfolder names.
+    """
+    global drive_service
+    if drive_service is None:
+        initialize_drive_service()
     
-    if save_to_csv and all_contents:
+    content_type = "subfolders" if subfolders else "files"
+    print(f"Fetching {content_type}...")
+    all_contents = []
+    if save_to_csv:
         header = 'foldername' if subfolders else 'filename'
-        pd.DataFrame(all_contents, columns=[header]).to_csv(
-            output_csv, mode='w', header=True, index=False
-        )
-        print(f"Saved {total_items} {content_type} to {output_csv}.")
+        f = None
+        pages = prefetch_folder_pages(drive_service, folder_id, subfolders, verbose)
+        try:
+            for batch in pages:
+                if f is None:  # Only create the file once there is something to save
+                    f = open(output_csv, 'w', newline='', buffering=1 << 20)
+                    writer = csv.writer(f)
+                    writer.writerow([header])
+                writer.writerows([name] for name in batch)
+                all_contents.extend(batch)
+        finally:
+            pages.close()  # Stops the prefetch thread if writing failed part-way
+            if f is not None:
+                f.close()
+    else:
+        all_contents = list_folder(drive_service, folder_id, subfolders, verbose)
+    total_items = len(all_contents)
+    
+    if total_items == 0:
+        print(f"No {content_type} found in the specified folder.")
+    elif save_to_csv:
+        print(f"Found {total_items} {content_type}, saved to {output_csv}.")
+    else:
+        print(f"Found {total_items} {content_type}.")
     
     return all_contents
 
+def get_folders_contents(folder_ids, subfolders=False, max_workers=LIST_WORKERS, verbose=False):
+    """
+    List several Drive folders concurrently.
+
+    Page tokens make each folder's listing serial, so the parallelism is across folders.
+    All threads share the Pacer, which keeps the total request rate within the Drive quota.
+    
+    Args:
+        folder_ids (list): IDs of the folders to list.
+        subfolders (bool): If True, list subfolders; if False, list files (default: False).
+        max_workers (int): Number of folders listed at the same time (default: LIST_WORKERS).
+        verbose (bool): If True, log every page instead of every PROGRESS_EVERY pages (default: False).
+    
+    Returns:
+        dict: Mapping of each folder ID to its list of file or subfolder names.
+    """
+    global drive_service
+    if drive_service is None:
+        initialize_drive_service()
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {folder_id: executor.submit(lambda f: list_folder(thread_drive_service(), f, subfolders, verbose), folder_id)
+                   for folder_id in folder_ids}
+        return {folder_id: future.result() for folder_id, future in futures.items()}
+
 def wait_for_drive_ready(folder_path, timeout=5, retry_interval=30):
     """
-    Wait until a Google Drive folder is accessible (i.e., os.listdir() succeeds).
+    Wait until a Google Drive folder is accessible (i.e., its first entry can be read).
     
     Args:
         folder_path (str): Path to the mounted Drive folder (e.g., '/content/drive/MyDrive/.../RAW').
@@ -186,7 +642,9 @@ def wait_for_drive_ready(folder_path, timeout=5, retry_interval=30):
         result = Queue()
         def try_list():
             try:
-                os.listdir(path)
+                # Reading one entry proves the folder is enumerable without listing all of it
+                with os.scandir(path) as entries:
+                    next(entries, None)
                 result.put(True)
             except Exception:
                 result.put(False)
@@ -0,0 +1,377 @@
+"""
+Shared data logging for the DAQ scripts: batched PostgreSQL writes and buffered CSV files.
+
+Samples are buffered in memory and written with a single COPY ... FROM STDIN
+per table and batch instead of one INSERT per sample, over connections taken
+from a psycopg2 ThreadedConnectionPool. Target tables use the usual
+(time, channels double precision[]) schema. AsyncDbWriter moves those inserts
+onto a background thread so a slow round-trip never stalls the acquisition loop,
+and start_queue_logging() does the same for the scripts' log output.
+CsvBatchWriter covers the local CSV copy (buffered writes, periodic flushes and
+optional rotation into numbered parts).
+"""
+import atexit
+import csv
+import io
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from time import monotonic
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+RETRY_DELAY_MIN = 0.1  # Seconds before the first retry after a failed flush
+RETRY_DELAY_MAX = 30.0  # Cap for the doubling retry delay
+
+
+class BatchPgLogger:
+    """
+    Buffer (time, channels) rows and insert them into PostgreSQL in batches.
+
+    Mirrors the ida_db.pglogger log()/close() interface so device scripts can
+    swap it in directly. The connection pool is created lazily; a connection
+    that fails during a flush is discarded from the pool, and the whole pool is
+    only rebuilt if the pool itself is broken. A connection that sat idle for
+    ping_interval seconds is checked with SELECT 1 before use. After a failure,
+    flushes back off exponentially (RETRY_DELAY_MIN doubling up to
+    RETRY_DELAY_MAX) instead of reconnecting on every row. Rows that could not
+    be written stay buffered for the next attempt, up to max_pending rows
+    (oldest rows are dropped first).
+
+    Args:
+        creds: Credentials module defining PGHOST, PGPORT, PGDATABASE, PGUSER and PGPASSWORD.
+        batch_size (int): Number of buffered rows that triggers a flush.
+        flush_interval (float, optional): Also flush once this many seconds have passed since the last flush.
+        max_pending (int): Maximum number of rows kept in memory while the database is unreachable.
+        max_connections (int): Upper bound on pooled connections.
+        ping_interval (float): Idle time after which a connection is pinged before it is used.
+    """
+
+    def __init__(self, creds, batch_size=10, flush_interval=None, max_pending=100000, max_connections=4,
+                 ping_interval=5.0):
+        self.creds = creds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_connections = max_connections
+        self.ping_interval = ping_interval
+        self.pending = deque(maxlen=max_pending)
+        self.pool = None
+        self.last_flush = monotonic()
+        self.last_write = monotonic()
+        self.retry_delay = RETRY_DELAY_MIN
+        self.next_retry_at = 0.0
+
+    def _create_pool(self):
+        self.pool = ThreadedConnectionPool(
+            1,
+            self.max_connections,
+            dbname=self.creds.PGDATABASE,
+            user=self.creds.PGUSER,
+            password=self.creds.PGPASSWORD,
+            host=self.creds.PGHOST,
+            port=self.creds.PGPORT,
+            connect_timeout=10,
+            # TCP keepalives so idle pooled connections survive (and dead ones are noticed) between flushes
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3
+        )
+
+    def _close_pool(self):
+        if self.pool is not None:
+            try:
+                self.pool.closeall()
+            except psycopg2.Error:
+                pass
+            self.pool = None
+
+    @staticmethod
+    def _ping(conn):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _schedule_retry(self):
+        delay = self.retry_delay
+        self.next_retry_at = monotonic() + delay
+        self.retry_delay = min(delay * 2, RETRY_DELAY_MAX)
+        return delay
+
+    def log(self, table, channels, time=None):
+        """
+        Buffer one row and flush once the batch is full or the flush interval has elapsed.
+
+        Args:
+            table (str): Destination table.
+            channels: Sequence or numpy array of channel values; NaN/None are stored as NULL.
+            time: Sample timestamp (datetime or string). Defaults to now.
+
+        Returns:
+            bool: False if a flush was attempted and failed, True otherwise.
+        """
+        if time is None:
+            time = datetime.now()
+        if hasattr(channels, "tolist"):
+            channels = channels.tolist()  # One C-level conversion instead of a numpy scalar per element
+        # Rows are kept as ready-made COPY text lines: <time> TAB {v1,v2,...}
+        values = ",".join("NULL" if v is None or v != v else repr(float(v)) for v in channels)
+        self.pending.append((table, f"{time}\t{{{values}}}\n"))
+        if len(self.pending) >= self.batch_size or (
+                self.flush_interval is not None and monotonic() - self.last_flush >= self.flush_interval):
+            return self.flush()
+        return True
+
+    def flush(self, force=False):
+        """
+        Write all buffered rows, one COPY per table.
+
+        Args:
+            force (bool): Attempt the write even while backing off after a failure.
+
+        Returns:
+            bool: False if the write was attempted and failed, True otherwise
+            (including when the attempt is deferred by the retry backoff).
+        """
+        now = monotonic()
+        self.last_flush = now
+        if not self.pending:
+            return True
+        if not force and now < self.next_retry_at:
+            return True  # Backing off; rows stay buffered until the next retry
+
+        batches = {}
+        for table, line in self.pending:
+            batches.setdefault(table, []).append(line)
+
+        try:
+            if self.pool is None:
+                self._create_pool()
+            conn = self.pool.getconn()
+            if now - self.last_write >= self.ping_interval and not self._ping(conn):
+                # Stale connection, e.g. dropped by the server while idle; replace it before writing
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+        except psycopg2.Error as e:  # Includes psycopg2.pool.PoolError
+            delay = self._schedule_retry()
+            logging.error(f"Could not get a database connection ({len(self.pending)} rows kept, "
+                          f"retrying in {delay:.1f} s): {e}")
+            self._close_pool()
+            return False
+
+        try:
+            with conn.cursor() as cur:
+                for table, lines in batches.items():
+                    cur.copy_expert(f"COPY {table} (time, channels) FROM STDIN", io.StringIO("".join(lines)))
+            conn.commit()
+        except psycopg2.Error as e:
+            delay = self._schedule_retry()
+            logging.error(f"Batched database insert failed ({len(self.pending)} rows kept, "
+                          f"retrying in {delay:.1f} s): {e}")
+            self.pool.putconn(conn, close=True)  # Drop the connection; the pool opens a fresh one on demand
+            return False
+
+        self.pool.putconn(conn)
+        self.pending.clear()
+        self.last_write = monotonic()
+        self.retry_delay = RETRY_DELAY_MIN
+        self.next_retry_at = 0.0
+        return True
+
+    def close(self):
+        """Flush any remaining rows (ignoring any retry backoff) and close all pooled connections."""
+        self.flush(force=True)
+        self._close_pool()
+
+
+_STOP = object()  # Queue sentinel telling the writer thread to exit
+
+
+class AsyncDbWriter:
+    """
+    Log rows to one table from a daemon thread fed by a bounded queue.
+
+    The acquisition loop only calls enqueue(), which never blocks; the writer
+    thread hands rows to a BatchPgLogger, so inserts are still batched by
+    batch_size / flush_interval and retried after failures. When the queue is
+    full the oldest queued row is dropped to make room.
+
+    Args:
+        creds: Credentials module defining PGHOST, PGPORT, PGDATABASE, PGUSER and PGPASSWORD.
+        table (str): Destination table.
+        batch_size (int): Number of buffered rows that triggers a flush.
+        flush_interval (float): Flush at least this often (seconds), even if no new rows arrive.
+        maxsize (int): Capacity of the hand-off queue.
+    """
+
+    def __init__(self, creds, table, batch_size=100, flush_interval=1.0, maxsize=10000):
+        self.table = table
+        self.logger = BatchPgLogger(creds, batch_size=batch_size, flush_interval=flush_interval)
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = threading.Thread(target=self._loop, name=f"db-writer-{table}", daemon=True)
+        self.thread.start()
+
+    def enqueue(self, time, channels):
+        """
+        Queue one row for the writer thread without blocking.
+
+        Args:
+            time: Sample timestamp (datetime or string). Taken at acquisition time, since the insert happens later.
+            channels: Sequence or numpy array of channel values; must not be modified after enqueueing.
+        """
+        try:
+            self.queue.put_nowait((time, channels))
+        except queue.Full:
+            logging.warning(f"Database queue for '{self.table}' is full; dropping the oldest row.")
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait((time, channels))
+            except (queue.Empty, queue.Full):
+                pass
+
+    def _loop(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.logger.flush_interval)
+            except queue.Empty:
+                try:
+                    self.logger.flush()  # Nothing new; push out whatever is still buffered
+                except Exception as e:
+                    logging.error(f"Database logging failed: {e}")
+                continue
+            if item is _STOP:
+                break
+            time, channels = item
+            try:
+                if not self.logger.log(self.table, channels, time=time):
+                    logging.warning(f"Failed to log data to table '{self.table}'. Will retry with the next batch.")
+            except Exception as e:
+                logging.error(f"Database logging failed: {e}")
+
+    def flush_and_close(self):
+        """Drain the queue, flush the remaining rows and close the database connections."""
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.logger.close()
+
+
+def open_db_writer(table, batch_size=100, flush_interval=1.0):
+    """
+    Create an AsyncDbWriter for the given table using psql_credentials from the Python path.
+
+    Args:
+        table (str): Destination table.
+        batch_size (int): Number of buffered rows that triggers a flush.
+        flush_interval (float): Flush at least this often (seconds).
+
+    Returns:
+        AsyncDbWriter: The running writer; call flush_and_close() on shutdown.
+    """
+    import psql_credentials as creds_cloud
+    db_writer = AsyncDbWriter(creds_cloud, table, batch_size=batch_size, flush_interval=flush_interval)
+    logging.info(f"Database logging initialized (batches of up to {batch_size} rows every {flush_interval:.0f} s).")
+    return db_writer
+
+
+class CsvBatchWriter:
+    """
+    Buffered CSV file that is flushed periodically rather than after every row.
+
+    Each file starts with the given header row. With max_rows set, a new file
+    is started once a file holds that many data rows; path_for receives the
+    1-based part number and returns the path of the next file. A file is
+    fsync'ed once when it is finished (on rotation or close), not per row.
+
+    Args:
+        path_for (callable): Maps a part number to a file path.
+        header (list): Header row written at the top of every file.
+        max_rows (int, optional): Data rows per file before rotating.
+        flush_interval (float): Seconds between explicit flushes.
+        buffer_size (int): Bytes buffered by the file object.
+    """
+
+    def __init__(self, path_for, header, max_rows=None, flush_interval=30.0, buffer_size=1 << 20):
+        self.path_for = path_for
+        self.header = header
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.file = None
+        self.file_index = 0
+        self._open_next()
+
+    def _finish_file(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+    def _open_next(self):
+        if self.file is not None:
+            self._finish_file()
+        self.file_index += 1
+        self.path = self.path_for(self.file_index)
+        self.file = open(self.path, 'w', newline='', buffering=self.buffer_size)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.header)
+        self.row_count = 0
+        self.last_flush = monotonic()
+        logging.info(f"CSV logging started. File: {self.path}")
+
+    def writerow(self, row):
+        """Write one data row, flushing or rotating the file when due."""
+        self.writer.writerow(row)
+        self.row_count += 1
+        if self.max_rows is not None and self.row_count >= self.max_rows:
+            logging.info(f"Reached {self.max_rows} rows, creating a new file.")
+            self._open_next()
+        elif monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows out to the file."""
+        self.file.flush()
+        self.last_flush = monotonic()
+
+    def close(self):
+        """Flush, sync and close the current file."""
+        self._finish_file()
+
+
+def start_queue_logging(*handlers, level=logging.INFO, fmt='%(asctime)s [%(levelname)s] %(message)s'):
+    """
+    Configure the root logger to hand records to a QueueListener thread.
+
+    Replaces logging.basicConfig(handlers=[...]) in the device scripts: the
+    acquisition loop only enqueues records, while file and console output is
+    written by the listener thread. The listener is stopped (and its queue
+    drained) at interpreter exit.
+
+    Args:
+        *handlers: Handlers that do the actual output, e.g. a FileHandler and a StreamHandler.
+        level: Root logger level.
+        fmt (str): Format applied to every handler.
+
+    Returns:
+        logging.handlers.QueueListener: The running listener.
+    """
+    formatter = logging.Formatter(fmt)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -1,6 +1,6 @@
 import logging
 from enum import Enum
-from time import sleep
+from time import monotonic, sleep
 import serial
 
 __all__ = ['KoradSerial', 'ChannelMode', 'OnOffState']
@@ -13,14 +13,17 @@ class OnOffState(Enum):
     off = 0
     on = 1
 
+# (channel1, beep, lock, output) for every possible status byte, decoded once at import
+_STATUS_TABLE = tuple(
+    (ChannelMode(s & 1), OnOffState((s >> 4) & 1), OnOffState((s >> 5) & 1), OnOffState((s >> 6) & 1))
+    for s in range(256)
+)
+
 class Status(object):
     def __init__(self, status):
         super(Status, self).__init__()
         self.raw = status
-        self.channel1 = ChannelMode(status & 1)
-        self.beep = OnOffState((status >> 4) & 1)
-        self.lock = OnOffState((status >> 5) & 1)
-        self.output = OnOffState((status >> 6) & 1)
+        self.channel1, self.beep, self.lock, self.output = _STATUS_TABLE[status & 0xFF]
 
     def __repr__(self):
         return "{0}".format(self.raw)
@@ -34,6 +37,10 @@ def float_or_none(value):
     except (TypeError, ValueError):
         return None
 
+# The PSU drops or merges commands that arrive back-to-back; this is the minimum gap between writes
+COMMAND_GAP = 0.05  # Seconds
+RETRY_DELAY = 0.005  # Seconds; only slept before a retry
+
 class KoradSerial(object):
     """ Wrapper for communicating with a programmable Korad KA3xxxP / KWR102 power supply. """
 
@@ -42,35 +49,35 @@ class KoradSerial(object):
         def __init__(self, port, debug=False):
             super(KoradSerial.Serial, self).__init__()
             self.debug = debug
-            self.port = serial.Serial(port, 9600, timeout=1)
-
-        def read_character(self):
-            return self.port.read(1).decode('ascii')
+            self.port = serial.Serial(port, 9600, timeout=0.15, write_timeout=0.15)
+            self.last_write = 0.0
 
         def read_string(self, fixed_length=None):
-            result = []
-            c = self.read_character()
-            while len(c) > 0 and ord(c) != 0:
-                result.append(c)
-                if fixed_length is not None and len(result) == fixed_length:
-                    break
-                c = self.read_character()
-            return ''.join(result)
+            # Returns as soon as the NUL terminator or fixed_length characters arrive, else at the port timeout
+            data = self.port.read_until(b'\x00', size=fixed_length)
+            if fixed_length is not None and len(data) != fixed_length and not data.endswith(b'\x00'):
+                # Cut off by the timeout; a partial number like "1" for "12.00" must not pass as a reading
+                raise ValueError(f"Incomplete response from power supply: {data!r}")
+            return data.rstrip(b'\x00').decode('ascii')
 
         def send(self, text):
             if self.debug:
-                print("_send: ", text)
-            sleep(0.1)
+                logging.debug("Sent to PSU: %r", text)
+            # Only wait for whatever is left of the gap since the previous command
+            wait = self.last_write + COMMAND_GAP - monotonic()
+            if wait > 0:
+                sleep(wait)
             self.port.write((text + "\r").encode('ascii'))
+            self.last_write = monotonic()
 
-        def send_receive(self, text, fixed_length=None, retries=3, delay=0.2):
+        def send_receive(self, text, fixed_length=None, retries=3, delay=RETRY_DELAY):
             for attempt in range(retries):
                 try:
                     self.send(text)
-                    sleep(delay)  
 
-                    response = self.read_string().strip()
-                    print(f"Raw Response from PSU: '{response}'")  
+                    response = self.read_string(fixed_length).strip()
+                    if self.debug:
+                        logging.debug("Raw PSU response: %r", response)
 
                     if not response:
                         raise ValueError("No response received from power supply.")
@@ -79,6 +86,7 @@ class KoradSerial(object):
                 except Exception as e:
                     logging.warning(f"Retrying due to error: {e}")
                     sleep(delay)
+                    self.port.reset_input_buffer()  # Drop a late reply so it is not read as the next answer
 
             logging.error(f"Failed to get a valid response after {retries} attempts")
             return None
@@ -105,9 +113,8 @@ class KoradSerial(object):
         else:
             self.channels = [KoradSerial.Channel(self.__serial, i) for i in range(1, 3)]
 
+        # Output is left as it is; callers switch it on once their limits are set
         self.output = KoradSerial.OnOffButton(self.__serial, "OUT1", "OUT0")
-        self.output.on()
-        sleep(0.2)
 
     class SingleChannelVoltage:
         def __init__(self, serial_):
@@ -200,6 +207,16 @@ class KoradSerial(object):
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
 
+    def snapshot(self, channel=1):
+        """
+        Read output voltage, output current, voltage setpoint and current setpoint back-to-back.
+        Returns a (vout, iout, vset, iset) tuple; values that could not be read are None.
+        """
+        if self.is_single_channel:
+            return self.voltage.output, self.current.output, self.voltage.setpoint, self.current.setpoint
+        ch = self.channels[channel - 1]
+        return ch.output_voltage, ch.output_current, ch.voltage, ch.current
+
     @property
     def status(self):
         status = self.__serial.send_receive("STATUS?")
@@ -3,16 +3,16 @@ import serial
 import logging
 import argparse
 import numpy as np
-import csv
 import sys
 import os
-from collections import namedtuple
 from datetime import datetime
 
 # Add the parent directory (../) to the Python path
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(parent_dir)
 
+from libs.ida_logging import CsvBatchWriter
+
 # Logging Setup
 logging.basicConfig(
     level=logging.INFO,
@@ -101,17 +101,10 @@ def reconnect_db():
 
 def setup_csv():
     """
-    Setup and return a CSV writer and its associated file handle in a named tuple.
+    Setup and return the buffered CSV writer (flushed periodically, synced on close).
     """
-    CsvHandle = namedtuple('CsvHandle', ['writer', 'file'])
-    start_time = datetime.now()
-    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_vacuumgauge_data.csv"
-    csv_file = open(filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["Timestamp", "Pressure (mbar)"])
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return CsvBatchWriter(lambda part: f"{timestamp}_vacuumgauge_data.csv", ["Timestamp", "Pressure (mbar)"])
 
 def main():
     """
@@ -153,8 +146,7 @@ def main():
                 logging.info(f"Pressure: {this_pressure} mbar")
 
                 # Write to CSV
-                csv_handle.writer.writerow([timestamp, this_pressure])
-                csv_handle.file.flush()
+                csv_handle.writerow([timestamp, this_pressure])
 
                 # Log data to the database
                 pressure_array = np.array([this_pressure])
@@ -173,7 +165,7 @@ def main():
     except KeyboardInterrupt:
         logging.info("Keyboard interrupt received. Stopping data acquisition.")
     finally:
-        csv_handle.file.close()
+        csv_handle.close()
         if db_cloud:
             db_cloud.close()
         logging.info("Resources cleaned up and program terminated.")
@@ -2,14 +2,13 @@ import pandas as pd
 import numpy as np
 import logging
 import argparse
-import csv
 import time
 import datetime
 import sys
 import os
 from serial import SerialException
-from collections import namedtuple
 from libs.ut61e import UT61E
+from libs.ida_logging import CsvBatchWriter
 
 # Add the parent directory (../) to the Python path
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -38,19 +37,10 @@ def reconnect_db():
 
 def setup_csv():
     """
-    Setup and return a CSV writer and its associated file handle in a named tuple.
+    Setup and return the buffered CSV writer (flushed periodically, synced on close).
     """
-    CsvHandle = namedtuple('CsvHandle', ['writer', 'file', 'filename'])
-    start_time = datetime.datetime.now()
-    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_multimeter_data.csv"
-    
-    csv_file = open(filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["Timestamp", "Value"])  # Write header
-
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file, filename=filename)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return CsvBatchWriter(lambda part: f"{timestamp}_multimeter_data.csv", ["Timestamp", "Value"])
 
 
 def read_multimeter(dmm):
@@ -112,8 +102,7 @@ def main():
             logging.info(f"Logging Value: {value}")
 
             # Write to CSV
-            csv_handle.writer.writerow([timestamp, value])  # Append the new row
-            csv_handle.file.flush()  # Flush to ensure data is saved immediately
+            csv_handle.writerow([timestamp, value])  # Append the new row
 
             # Log data to the database
             success_cloud = db_cloud.log(table=args.table, channels=np.array([value]))
@@ -128,7 +117,7 @@ def main():
     finally:
         del dmm
         logging.info("Multimeter disconnected.")
-        csv_handle.file.close()
+        csv_handle.close()
 
 if __name__ == "__main__":
     main()
@@ -2,17 +2,17 @@ import numpy as np
 import serial
 import logging
 import argparse
-import csv
 import sys
 import os
 import time
-from collections import namedtuple
 from datetime import datetime
 
 # Add the parent directory (../) to the Python path
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(parent_dir)
 
+from libs.ida_logging import CsvBatchWriter
+
 # Logging Setup
 logging.basicConfig(
     level=logging.INFO,
@@ -50,17 +50,10 @@ def reconnect_db():
 
 def setup_csv():
     """
-    Setup and return a CSV writer and its associated file handle in a named tuple.
+    Setup and return the buffered CSV writer (flushed periodically, synced on close).
     """
-    CsvHandle = namedtuple('CsvHandle', ['writer', 'file'])
-    start_time = datetime.now()
-    timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_detector_data.csv"
-    csv_file = open(filename, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["Timestamp", "Detector Value"])
-    logging.info(f"CSV logging started. File: {filename}")
-    return CsvHandle(writer=csv_writer, file=csv_file)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return CsvBatchWriter(lambda part: f"{timestamp}_detector_data.csv", ["Timestamp", "Detector Value"])
 
 def init_serial(com_port):
     """
@@ -156,8 +149,7 @@ def main():
                     logging.info(f"Detector Value: {value}")
 
                     # Write to CSV
-                    csv_handle.writer.writerow([timestamp, value])
-                    csv_handle.file.flush()
+                    csv_handle.writerow([timestamp, value])
 
                     # Log data to the database
                     data_array = np.array([value])
@@ -176,7 +168,7 @@ def main():
     except KeyboardInterrupt:
         logging.info("Keyboard interrupt received. Stopping data acquisition.")
     finally:
-        csv_handle.file.close()
+        csv_handle.close()
         ser.close()
         if db_cloud:
             db_cloud.close()